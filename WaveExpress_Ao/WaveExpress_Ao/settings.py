@@ -32,12 +32,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'WaveExpress_Ao.static.StaticFilesMiddleware',
+    'ferry_system.middleware.SlowRequestProfilerMiddleware',
+    'ferry_system.middleware.AuditBufferMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ferry_system.middleware.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'WaveExpress_Ao.urls'
@@ -46,7 +50,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -54,6 +57,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; with DEBUG the cache is
+            # still reset when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -76,6 +87,55 @@ DATABASES = {
     }
 }
 
+# Read replica for search and reporting reads (see ferry_system.routers).
+# Without WAVEEXPRESS_REPLICA_HOST every query goes to the primary.
+if os.environ.get('WAVEEXPRESS_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['WAVEEXPRESS_REPLICA_HOST'],
+        'PORT': os.environ.get('WAVEEXPRESS_REPLICA_PORT', '3306'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['ferry_system.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# Seconds a client keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = 5
+
+# Shared by every web process and worker: the token revocation counter, the
+# port matrix and overbooking allowances must be the same everywhere.
+# Create the table with ``manage.py createcachetable``; a Redis or Memcached
+# backend can replace it where one is deployed.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'ferry_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# Per-client token buckets (requests per second, burst) of the public
+# availability and search APIs, and how long identical lookups share a result
+FERRY_RATE_LIMITS = {
+    'availability': (5, 20),
+    'search': (2, 10),
+}
+COALESCE_WINDOW = 1.0
+
+# Most a sailing is overbooked on the strength of its no-show history
+# (ferry_system.capacity); 0 sells the physical capacity only. The allowances
+# are kept in the shared cache configured in CACHES above, and for a few
+# minutes in the memory of each process that reads them.
+MAX_OVERBOOKING = 0.10
+
+# Set WAVEEXPRESS_PROFILE_DIR to write sampled stack profiles (folded format,
+# for flamegraph.pl or speedscope) of requests slower than the threshold, or
+# of staff requests sent with an X-Profile header
+PROFILE_DIR = os.environ.get('WAVEEXPRESS_PROFILE_DIR')
+PROFILE_SLOW_REQUEST_MS = 500
+PROFILE_SAMPLE_INTERVAL_MS = 5
+PROFILE_MAX_PER_MINUTE = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -113,6 +173,34 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# collectstatic writes hashed, precompressed copies here; with DEBUG off they
+# are served by WaveExpress_Ao.static.StaticFilesMiddleware
+STATIC_ROOT = os.environ.get('WAVEEXPRESS_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'WaveExpress_Ao.static.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Accepted boarding scans are journaled here until they are written to the
+# database, so a web process that dies mid-boarding loses none of them
+CHECKIN_JOURNAL_DIR = os.environ.get('WAVEEXPRESS_CHECKIN_JOURNAL_DIR', os.path.join(BASE_DIR, 'checkin-journal'))
+
+# Email: booking confirmations and waitlist offers are sent by run_workers.
+# Without WAVEEXPRESS_EMAIL_HOST mail is printed to the worker's console and
+# ticket confirmations are not queued at all
+EMAIL_HOST = os.environ.get('WAVEEXPRESS_EMAIL_HOST', '')
+EMAIL_PORT = int(os.environ.get('WAVEEXPRESS_EMAIL_PORT', '25'))
+EMAIL_USE_TLS = bool(os.environ.get('WAVEEXPRESS_EMAIL_USE_TLS'))
+EMAIL_BACKEND = (
+    'django.core.mail.backends.smtp.EmailBackend' if EMAIL_HOST
+    else 'django.core.mail.backends.console.EmailBackend'
+)
+DEFAULT_FROM_EMAIL = os.environ.get('WAVEEXPRESS_FROM_EMAIL', 'bookings@waveexpress.local')
+SEND_TICKET_CONFIRMATIONS = bool(EMAIL_HOST)
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
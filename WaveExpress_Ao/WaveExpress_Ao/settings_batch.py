@@ -0,0 +1,21 @@
+"""
+Slim settings for cron jobs, exporters and background workers.
+
+Only the apps that own models are installed: no admin, sessions, messages or
+staticfiles, no middleware and no template engine, so ``manage.py`` spends
+less of a short run starting up. Web processes keep using the full settings.
+
+    DJANGO_SETTINGS_MODULE=WaveExpress_Ao.settings_batch python manage.py export_bookings /data/exports
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'accounts',
+    'ferry_system',
+]
+
+MIDDLEWARE = []
+TEMPLATES = []
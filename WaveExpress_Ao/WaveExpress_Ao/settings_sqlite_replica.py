@@ -0,0 +1,25 @@
+"""
+Local two-database setup for exercising read-replica routing.
+
+Both aliases are separate SQLite files with their own schema. The routing
+tests (ferry_system.tests.test_replica_routing) only run with a replica:
+
+    python manage.py test ferry_system --settings=WaveExpress_Ao.settings_sqlite_replica
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+    },
+}
+
+# There is no replication between the files, so the replica gets its own schema
+REPLICA_MIGRATE = True
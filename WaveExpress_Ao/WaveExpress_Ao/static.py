@@ -0,0 +1,172 @@
+"""
+Production static files: hashed names, precompressed variants and serving.
+
+``CompressedManifestStaticFilesStorage`` is the manifest storage (``{% static
+'css/style.css' %}`` resolves to ``css/style.<hash>.css``) that also writes a
+``.gz`` and, when the ``brotli`` package is installed, a ``.br`` file next to
+every compressible file at ``collectstatic``, so nothing is compressed while
+serving.
+
+``StaticFilesMiddleware`` serves ``STATIC_ROOT`` from the Django process for
+single-box deployments without a separate web server. It indexes the
+collected files once at startup, answers with the smallest variant the
+client accepts, and marks hashed names cacheable for a year; unhashed names
+are only cached briefly because their content changes under the same URL.
+"""
+
+import gzip
+import hashlib
+import importlib
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+MIN_COMPRESS_SIZE = 256
+FAR_FUTURE_MAX_AGE = 365 * 24 * 60 * 60
+SHORT_MAX_AGE = 60
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _brotli():
+    try:
+        return importlib.import_module('brotli')
+    except ImportError:
+        return None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that writes precompressed variants of the hashed files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                processed_names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        brotli = _brotli()
+        for name in sorted(processed_names):
+            for compressed_name in self.compress(name, brotli):
+                yield name, compressed_name, True
+
+    def compress(self, name, brotli=None):
+        """Write ``name.gz`` (and ``name.br``) when that makes the file meaningfully smaller."""
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return []
+        with self.open(name) as stream:
+            content = stream.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return []
+
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+        written = []
+        for suffix, compressed in variants:
+            # Not worth a Content-Encoding round trip unless it saves at least 5%
+            if len(compressed) >= len(content) * 0.95:
+                continue
+            with open(self.path(name) + suffix, 'wb') as stream:
+                stream.write(compressed)
+            written.append(name + suffix)
+        return written
+
+
+class StaticFile:
+    __slots__ = ('path', 'size', 'content_type', 'etag', 'last_modified', 'cache_control', 'variants')
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.etag = '"%s"' % hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode()).hexdigest()[:16]
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        max_age = FAR_FUTURE_MAX_AGE if immutable else SHORT_MAX_AGE
+        self.cache_control = f"public, max-age={max_age}" + (', immutable' if immutable else '')
+        # Each encoding is a different representation and needs its own ETag
+        self.variants = [
+            (encoding, path + suffix, os.path.getsize(path + suffix), f'{self.etag[:-1]}-{encoding}"')
+            for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)
+        ]
+
+    def variant(self, accept_encoding):
+        """``(encoding or None, path, size, etag)`` of the best variant the client accepts."""
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        for variant in self.variants:
+            if variant[0] in accepted:
+                return variant
+        return None, self.path, self.size, self.etag
+
+
+def index_static_root(root):
+    """Map URL paths below ``STATIC_URL`` to the files collected in ``root``."""
+    hashed_names = set(ManifestStaticFilesStorage(location=root).hashed_files.values())
+    files = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')) and os.path.isfile(os.path.join(directory, filename[:-3])):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            files[name] = StaticFile(path, immutable=name in hashed_names)
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files from ``STATIC_ROOT`` with cache headers and
+    precompressed variants. Placed right after ``SecurityMiddleware`` so
+    asset requests skip sessions, auth and the URL resolver.
+    """
+
+    def __init__(self, get_response):
+        # runserver serves the app directories itself while DEBUG is on
+        if settings.DEBUG or not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = index_static_root(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if not request.path_info.startswith(self.prefix):
+            return self.get_response(request)
+        static_file = self.files.get(posixpath.normpath(request.path_info[len(self.prefix):]))
+        if static_file is None:
+            return self.get_response(request)
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return self.serve(request, static_file)
+
+    def serve(self, request, static_file):
+        encoding, path, size, etag = static_file.variant(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponse(status=304)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = str(size)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # FileResponse names the file it sends, which would be the .gz/.br variant
+            del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if static_file.variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = static_file.cache_control
+        response['ETag'] = etag
+        response['Last-Modified'] = static_file.last_modified
+        return response
@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+
+from accounts.forms import UserLoginForm, UserRegistrationForm
+from accounts.templatetags import form_tags
+from ferry_system.models import Passenger
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = ("Time rendering of the register, login and profile pages with uncached template loaders, "
+            "with the cached loader, and with the cached loader plus cached unbound form widgets.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def pages(self):
+        factory = RequestFactory()
+        anonymous = AnonymousUser()
+        user = User(pk=1, username='benchmark', first_name='Bench', last_name='Mark', email='bench@example.com')
+        passenger = Passenger(passenger_name='Bench Mark', contact_number='0917 000 0000',
+                              address='Pier 1', email=user.email)
+        return [
+            ('register', 'accounts/register.html', '/accounts/register/', anonymous,
+             lambda: {'form': UserRegistrationForm()}),
+            ('login', 'accounts/login.html', '/accounts/login/', anonymous,
+             lambda: {'form': UserLoginForm()}),
+            ('profile', 'accounts/profile.html', '/accounts/profile/', user,
+             lambda: {'passenger': passenger, 'staff': None, 'is_passenger': True, 'is_staff': False}),
+        ], factory
+
+    def _time(self, engine, template_name, request, make_context, iterations, cache_widgets):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            if not cache_widgets:
+                form_tags._unbound_widgets.clear()
+            # Views build a fresh form per request, so the context is built inside the loop
+            engine.get_template(template_name).render(RequestContext(request, make_context()))
+        return (time.perf_counter() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        cached = engines['django'].engine
+        uncached = Engine(
+            dirs=cached.dirs, loaders=UNCACHED_LOADERS, context_processors=cached.context_processors,
+            debug=cached.debug, libraries=cached.libraries, builtins=cached.builtins,
+        )
+        iterations = options['iterations']
+        pages, factory = self.pages()
+
+        self.stdout.write(f"Mean render time in ms over {iterations} renders")
+        self.stdout.write(f"{'page':10}{'uncached loader':>18}{'cached loader':>16}{'+ widget cache':>17}")
+        for name, template_name, path, user, make_context in pages:
+            request = factory.get(path)
+            request.user = user
+            # Warm both engines and the form renderer so first-render costs are not counted
+            for engine in (uncached, cached):
+                self._time(engine, template_name, request, make_context, 1, True)
+            times = [
+                self._time(uncached, template_name, request, make_context, iterations, False),
+                self._time(cached, template_name, request, make_context, iterations, False),
+                self._time(cached, template_name, request, make_context, iterations, True),
+            ]
+            self.stdout.write(f"{name:10}" + ''.join(f"{value:>{width}.3f}" for value, width in zip(times, (18, 16, 17))))
@@ -1,8 +1,54 @@
+import threading
+from collections import OrderedDict
+
 from django import template
+from django.utils import translation
 
 register = template.Library()
 
+# Rendered widgets of unbound, empty fields without choices, keyed by
+# everything their markup depends on. It is the same for every request, so it
+# is rendered once per process; the least recently used entries are dropped
+# beyond MAX_CACHED_WIDGETS.
+MAX_CACHED_WIDGETS = 512
+_unbound_widgets = OrderedDict()
+_unbound_widgets_lock = threading.Lock()
+
+
+def _merge_classes(existing, css_class):
+    classes = (existing or '').split()
+    classes += [name for name in css_class.split() if name not in classes]
+    return ' '.join(classes)
+
+
+def _cacheable(field):
+    """Whether the markup of ``field`` depends only on its form class and attributes."""
+    if field.form.is_bound or field.value() not in (None, ''):
+        return False
+    # Choices (and querysets) can differ per form instance and change between requests
+    return not hasattr(field.field, 'choices') and not hasattr(field.field.widget, 'choices')
+
+
 @register.filter(name='add_class')
 def add_class(field, css_class):
     """Add a CSS class to the form field."""
-    return field.as_widget(attrs={"class": css_class})
+    attrs = {'class': _merge_classes(field.field.widget.attrs.get('class'), css_class)}
+    if not _cacheable(field):
+        return field.as_widget(attrs=attrs)
+
+    form = field.form
+    key = (
+        type(form), form.prefix, form.auto_id, field.name, css_class, translation.get_language(),
+        field.field.required, field.field.disabled, repr(sorted(field.field.widget.attrs.items())),
+    )
+    with _unbound_widgets_lock:
+        widget = _unbound_widgets.get(key)
+        if widget is not None:
+            _unbound_widgets.move_to_end(key)
+            return widget
+    widget = field.as_widget(attrs=attrs)
+    with _unbound_widgets_lock:
+        _unbound_widgets[key] = widget
+        if len(_unbound_widgets) > MAX_CACHED_WIDGETS:
+            _unbound_widgets.popitem(last=False)
+    return widget
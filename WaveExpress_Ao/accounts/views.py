@@ -2,9 +2,11 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.utils import timezone
 from .forms import UserRegistrationForm, UserLoginForm, ProfileUpdateForm
 from .models import UserProfile
-from ferry_system.models import Passenger, Staff
+from ferry_system.models import Passenger, Reservation, Staff
+from ferry_system.queries import upcoming_departures, upcoming_trips
 
 def landing_page(request):
     """Simple landing page view"""
@@ -121,4 +123,17 @@ def profile_update(request):
 
 def home_view(request):
     """Home page view"""
-    return render(request, 'home.html')
+    now = timezone.now()
+    context = {
+        # Read from the materialized summary, see ferry_system.departures
+        'departures': upcoming_departures(now),
+        'trips': [],
+    }
+    if request.user.is_authenticated:
+        # Tickets and reservations in one query
+        statuses = dict(Reservation.RESERVATION_STATUS_CHOICES)
+        context['trips'] = [
+            {**trip, 'state': statuses.get(trip['state'], trip['state'])}
+            for trip in upcoming_trips(request.user, now)
+        ]
+    return render(request, 'home.html', context)
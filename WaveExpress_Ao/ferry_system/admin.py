@@ -1,13 +1,105 @@
 from django.contrib import admin
-from .models import Ferry, Port, Route, Schedule, Passenger, Ticket, Reservation, Payment, Staff, FerryAssignment
+from .models import (
+    Ferry, Port, Route, Schedule, Passenger, Ticket, Reservation, Payment, Staff, FerryAssignment, BookingEvent, Job,
+    WaitlistEntry, NoShowRollup,
+)
+
+
+# The __str__ of most models follows foreign keys, so each changelist selects
+# the related rows it displays instead of issuing one query per row.
+
+class RouteAdmin(admin.ModelAdmin):
+    list_display = ('route_name', 'departure_port', 'arrival_port', 'distance')
+    list_select_related = ('departure_port', 'arrival_port')
+
+
+class ScheduleAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'ferry', 'departure_time', 'arrival_time', 'price', 'reserve', 'cancelled')
+    list_select_related = ('route', 'ferry')
+    list_filter = ('reserve', 'cancelled')
+    date_hierarchy = 'departure_time'
+
+
+class PassengerAdmin(admin.ModelAdmin):
+    list_display = ('passenger_name', 'email', 'contact_number')
+    search_fields = ('passenger_name', '=email')
+
+
+class TicketAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'schedule', 'seat_number', 'ticket_status', 'payment_status', 'purchase_date')
+    list_select_related = ('passenger', 'schedule__route')
+    list_filter = ('ticket_status', 'payment_status')
+    raw_id_fields = ('schedule', 'passenger')
+
+
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'schedule', 'status', 'date_of_reservation')
+    list_select_related = ('passenger', 'schedule__route')
+    list_filter = ('status',)
+    raw_id_fields = ('schedule', 'passenger')
+
+
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'amount', 'payment_method', 'payment_status', 'payment_date')
+    list_select_related = ('ticket', 'reservation')
+    list_filter = ('payment_status', 'payment_method')
+    raw_id_fields = ('ticket', 'reservation')
+
+
+class FerryAssignmentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'staff', 'assignment_date')
+    list_select_related = ('ferry', 'schedule__route', 'staff')
+    raw_id_fields = ('schedule',)
+
+
+class BookingEventAdmin(admin.ModelAdmin):
+    """Read-only view of the append-only booking audit log"""
+    list_display = ('occurred_at', 'entity_type', 'entity_id', 'field', 'old_value', 'new_value', 'source')
+    list_filter = ('entity_type', 'source')
+    search_fields = ('=entity_id',)
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'name', 'status', 'attempts', 'run_after', 'finished_at', 'last_error')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
+
+
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'schedule', 'priority', 'position', 'status', 'hold_expires_at')
+    list_select_related = ('passenger', 'schedule__route')
+    list_filter = ('status', 'priority')
+    raw_id_fields = ('schedule', 'passenger', 'ticket')
+
+
+class NoShowRollupAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'weekday', 'hour', 'sailings', 'tickets', 'no_shows', 'updated_at')
+    list_select_related = ('route',)
+    list_filter = ('weekday',)
+    readonly_fields = ('route', 'weekday', 'hour', 'sailings', 'tickets', 'no_shows', 'updated_at')
+
 
 admin.site.register(Ferry)
 admin.site.register(Port)
-admin.site.register(Route)
-admin.site.register(Schedule)
-admin.site.register(Passenger)
-admin.site.register(Ticket)
-admin.site.register(Reservation)
-admin.site.register(Payment)
+admin.site.register(Route, RouteAdmin)
+admin.site.register(Schedule, ScheduleAdmin)
+admin.site.register(Passenger, PassengerAdmin)
+admin.site.register(Ticket, TicketAdmin)
+admin.site.register(Reservation, ReservationAdmin)
+admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Staff)
-admin.site.register(FerryAssignment)
+admin.site.register(FerryAssignment, FerryAssignmentAdmin)
+admin.site.register(BookingEvent, BookingEventAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(WaitlistEntry, WaitlistEntryAdmin)
+admin.site.register(NoShowRollup, NoShowRollupAdmin)
@@ -0,0 +1,130 @@
+"""
+Append-only audit log of booking state changes.
+
+Changes are collected for the whole unit of work, a web request (see
+``AuditBufferMiddleware``) or a background job, and written with one
+``bulk_create`` at its end, so a request that saves bookings one by one in
+autocommit mode still adds a single insert. Changes made inside a
+transaction join the buffer only when it commits (``transaction.on_commit``),
+so rolled back changes are never logged. Outside a ``buffered`` block (shell,
+management commands) events are written when they happen, or when their
+transaction commits.
+
+Model saves are tracked by signals (see ``ferry_system.signals``) that
+compare against the values the instance was loaded with, so auditing never
+costs an extra read. Bulk ``update()`` paths call ``record_many`` with the
+old values they already selected, and ``bulk_create()`` paths call
+``record_created``.
+"""
+
+import contextlib
+import contextvars
+
+from django.db import transaction
+
+from .models import BookingEvent
+
+TRACKED_FIELDS = {
+    'ticket': ('ticket_status', 'payment_status', 'schedule_id'),
+    'reservation': ('status',),
+    'payment': ('payment_status',),
+}
+
+_buffer = contextvars.ContextVar('ferry_system_audit_buffer', default=None)
+
+
+def _write(events):
+    buffer = _buffer.get()
+    if buffer is None:
+        BookingEvent.objects.bulk_create(events, batch_size=1000)
+    else:
+        buffer.extend(events)
+
+
+@contextlib.contextmanager
+def buffered():
+    """Collect the events of a request or job and write them with one insert at the end. Nests."""
+    if _buffer.get() is not None:
+        yield
+        return
+    events = []
+    token = _buffer.set(events)
+    try:
+        yield
+    finally:
+        _buffer.reset(token)
+        if events:
+            BookingEvent.objects.bulk_create(events, batch_size=1000)
+
+
+def _append(events):
+    if transaction.get_connection().in_atomic_block:
+        # Django drops the callback if the transaction rolls back
+        transaction.on_commit(lambda: _write(events))
+    else:
+        _write(events)
+
+
+def _value(value):
+    return None if value is None else str(value)
+
+
+def record(entity_type, entity_id, field, old_value, new_value, source=''):
+    """Log one change of ``field`` on a booking entity."""
+    if old_value != new_value:
+        _append([BookingEvent(entity_type=entity_type, entity_id=entity_id, field=field,
+                              old_value=_value(old_value), new_value=_value(new_value), source=source)])
+
+
+def record_many(entity_type, changes, field, new_value, source=''):
+    """Log a bulk update: ``changes`` is an iterable of ``(entity_id, old_value)``."""
+    events = [
+        BookingEvent(entity_type=entity_type, entity_id=entity_id, field=field,
+                     old_value=_value(old_value), new_value=_value(new_value), source=source)
+        for entity_id, old_value in changes
+        if old_value != new_value
+    ]
+    if events:
+        _append(events)
+
+
+def record_created(entity_type, rows, source=''):
+    """
+    Log bulk created rows the way a save logs a new instance: ``rows`` is an
+    iterable of ``(entity_id, {field: value})`` with every tracked field.
+    """
+    events = [
+        BookingEvent(entity_type=entity_type, entity_id=entity_id, field=field,
+                     old_value=None, new_value=_value(value), source=source)
+        for entity_id, values in rows
+        for field, value in values.items()
+        if value is not None
+    ]
+    if events:
+        _append(events)
+
+
+def snapshot(instance):
+    """The tracked field values of a Ticket, Reservation or Payment instance."""
+    fields = TRACKED_FIELDS[instance._meta.model_name]
+    return {field: instance.__dict__.get(field) for field in fields}
+
+
+def history(entity_type, entity_id):
+    """Events of one booking entity, oldest first."""
+    return BookingEvent.objects.filter(entity_type=entity_type, entity_id=entity_id).order_by('event_id')
+
+
+def replay(entity_type, entity_id, until=None):
+    """
+    Rebuild the tracked state of a booking entity from its events, optionally
+    as of ``until``. Returns a dict of field values (fields never changed
+    since creation keep their creation value).
+    """
+    events = history(entity_type, entity_id)
+    if until is not None:
+        events = events.filter(occurred_at__lte=until)
+    state = {}
+    for field, new_value in events.values_list('field', 'new_value'):
+        state[field] = new_value
+    return state
@@ -0,0 +1,170 @@
+"""
+Reserve-then-pay booking of a seat.
+
+``reserve`` records a PENDING reservation on a sailing that takes
+reservations; it does not hold a seat. A passenger may have at most
+``MAX_PENDING`` unpaid reservations (checked under their passenger row lock),
+and a reservation that is not paid within ``PENDING_TTL`` expires: ``pay``
+refuses it and the ``expire_reservations`` job, queued for the minute after
+it lapses, cancels it. ``pay``
+locks the reservation and the schedule row, checks tickets sold plus active
+waitlist holds against the sellable capacity (see ferry_system.capacity) and
+writes the ticket, its payment and the confirmed reservation in one
+transaction. Only the schedule row is locked (``FOR UPDATE OF``), so payments
+for one sailing queue behind each other while other sailings, and other
+sailings of the same ferry, are unaffected. ``pay_hold`` sells a seat held
+for a waitlist entry (see ferry_system.waitlist) the same way.
+"""
+
+import datetime
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import audit
+from .capacity import sellable_capacity
+from .jobs import enqueue
+from .models import Passenger, Payment, Reservation, Schedule, Ticket, WaitlistEntry
+from .waitlist import active_holds, free_seats
+
+PAYMENT_METHODS = dict(Payment.PAYMENT_METHOD_CHOICES)
+MAX_PENDING = 3
+PENDING_TTL = datetime.timedelta(minutes=15)
+
+
+def reserve(schedule_id, passenger, now=None):
+    """Reserve a seat on a sailing for ``passenger``. Raises ValidationError if it cannot be booked."""
+    now = now or timezone.now()
+    schedule = (
+        Schedule.objects.filter(schedule_id=schedule_id)
+        .values_list('departure_time', 'reserve', 'cancelled')
+        .first()
+    )
+    if schedule is None:
+        raise ValidationError("This sailing does not exist.")
+    departure_time, takes_reservations, cancelled = schedule
+    if cancelled:
+        raise ValidationError("This sailing has been cancelled.")
+    if departure_time <= now:
+        raise ValidationError("This sailing has already departed.")
+    if not takes_reservations:
+        raise ValidationError("This schedule does not allow reservations.")
+    if free_seats(schedule_id, now) <= 0:
+        raise ValidationError("This sailing is sold out.")
+
+    with transaction.atomic():
+        # Serializes the reservations of one passenger, so the cap holds
+        Passenger.objects.select_for_update().filter(passenger_id=passenger.pk).values_list('passenger_id').first()
+        pending = Reservation.objects.filter(
+            passenger=passenger, status='PENDING', date_of_reservation__gt=now - PENDING_TTL,
+        ).count()
+        if pending >= MAX_PENDING:
+            raise ValidationError(
+                f"You already have {pending} unpaid reservations; pay them or let them expire first."
+            )
+        reservation = Reservation.objects.create(schedule_id=schedule_id, passenger=passenger, date_of_reservation=now)
+        # One expiry sweep per minute of expiry times, run just after that minute
+        expires = now + PENDING_TTL
+        sweep_at = expires.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        enqueue('expire_reservations', delay=sweep_at - now,
+                dedupe_key=f"expire_reservations:{sweep_at:%Y%m%d%H%M}")
+    return reservation
+
+
+def expire_reservations(now=None):
+    """Cancel PENDING reservations older than ``PENDING_TTL``. Returns the number expired."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            Reservation.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', date_of_reservation__lte=now - PENDING_TTL)
+            .values_list('reservation_id', flat=True)
+        )
+        Reservation.objects.filter(reservation_id__in=expired).update(status='CANCELLED')
+        audit.record_many('reservation', ((pk, 'PENDING') for pk in expired), 'status', 'CANCELLED', 'expiry')
+    return len(expired)
+
+
+def _sell(schedule_id, passenger_id, payment_method, now, exclude_entry_id=None):
+    """
+    Write a paid ticket and its payment under the schedule row lock, once
+    the sailing is neither cancelled nor departed and has a seat left.
+    ``exclude_entry_id`` is the waitlist hold being paid, whose seat is free.
+    """
+    capacity, price, departure_time, cancelled = (
+        Schedule.objects.select_for_update(of=('self',))
+        .filter(schedule_id=schedule_id)
+        .values_list('ferry__capacity', 'price', 'departure_time', 'cancelled')
+        .get()
+    )
+    # cancel_sailings flags the sailing under the same row lock
+    if cancelled:
+        raise ValidationError("This sailing has been cancelled.")
+    if departure_time <= now:
+        raise ValidationError("This sailing has already departed.")
+    sold = (
+        Ticket.objects.filter(schedule_id=schedule_id)
+        .exclude(ticket_status='CANCELLED')
+        .aggregate(sold=Count('ticket_id'))['sold']
+    )
+    held = active_holds(schedule_id, now, exclude_entry_id=exclude_entry_id)
+    if sold + held >= sellable_capacity(schedule_id, capacity):
+        raise ValidationError("This sailing is sold out.")
+
+    ticket = Ticket.objects.create(schedule_id=schedule_id, passenger_id=passenger_id, payment_status='PAID')
+    Payment.objects.create(
+        amount=price, payment_method=payment_method, payment_status='COMPLETED',
+        transaction_reference=f"PAY-{uuid.uuid4().hex[:16]}", ticket=ticket,
+    )
+    return ticket
+
+
+def pay(reservation_id, passenger, payment_method='CREDIT_CARD', now=None):
+    """
+    Pay a pending reservation of ``passenger``: returns the new ticket.
+    Raises ValidationError when the reservation is not payable or the sailing
+    sold out in the meantime.
+    """
+    if payment_method not in PAYMENT_METHODS:
+        raise ValidationError("Unknown payment method.")
+    now = now or timezone.now()
+    with transaction.atomic():
+        reservation = (
+            Reservation.objects.select_for_update()
+            .filter(reservation_id=reservation_id, passenger=passenger)
+            .first()
+        )
+        if reservation is None or reservation.status != 'PENDING':
+            raise ValidationError("There is no pending reservation to pay.")
+        if reservation.date_of_reservation <= now - PENDING_TTL:
+            raise ValidationError("This reservation has expired.")
+
+        ticket = _sell(reservation.schedule_id, passenger.pk, payment_method, now)
+        reservation.status = 'CONFIRMED'
+        reservation.save(update_fields=['status'])
+    return ticket
+
+
+def pay_hold(entry_id, payment_method='CREDIT_CARD', now=None):
+    """
+    Pay the seat held for a waitlist entry: returns the new ticket. The hold
+    plays the part of a pending reservation, with ``hold_expires_at`` as its
+    deadline. Raises ValidationError when the hold is gone or the sailing
+    can no longer be sold.
+    """
+    if payment_method not in PAYMENT_METHODS:
+        raise ValidationError("Unknown payment method.")
+    now = now or timezone.now()
+    with transaction.atomic():
+        entry = WaitlistEntry.objects.select_for_update().filter(entry_id=entry_id).first()
+        if entry is None or entry.status != 'HELD':
+            raise ValidationError("There is no seat held for this waitlist entry.")
+        if entry.hold_expires_at <= now:
+            raise ValidationError("The seat hold has expired.")
+
+        ticket = _sell(entry.schedule_id, entry.passenger_id, payment_method, now, exclude_entry_id=entry_id)
+        WaitlistEntry.objects.filter(entry_id=entry_id).update(status='CONVERTED', ticket=ticket)
+    return ticket
@@ -0,0 +1,263 @@
+"""
+Sellable capacity from historical no-show rates.
+
+Passengers with a ticket do not all turn up: tickets still ACTIVE once their
+sailing has departed are no-shows, boarded ones are USED. ``rollup_no_shows``
+adds the ticket and no-show counts of newly departed sailings to
+``NoShowRollup`` rows per route, weekday and departure hour. It only reads
+sailings that departed after the ``RollupWatermark`` (and at least
+``SETTLE_DELAY`` ago, once check-in has been flushed), one grouped query per
+``ROLLUP_WINDOW``, so history is never scanned twice. Sailings without a
+single USED ticket are left out: they were not checked in, so their ACTIVE
+tickets say nothing about no-shows.
+
+From those rates each upcoming sailing gets an overbooking allowance: the
+lower 95% Wilson bound of its slot's no-show rate (or the route's, while the
+slot has fewer than ``MIN_TICKETS`` tickets), capped at ``MAX_OVERBOOKING``.
+The sellable capacity is ``capacity + floor(capacity * allowance)``; booking,
+waitlists, search, the departures summary and rebooking all sell against it.
+Allowances are kept in the shared cache (``CACHES`` in settings) per schedule
+and warmed after every rollup. Each process also keeps the allowances it
+read for ``LOCAL_TIMEOUT``, so the booking path usually finds them in memory
+without a query; after that they are read from the shared cache again, which
+is how a rollup run by a worker reaches the web processes. On a shared cache
+miss the allowance is computed with two queries and cached.
+"""
+
+import datetime
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .models import NoShowRollup, RollupWatermark, Schedule, Ticket
+
+WATERMARK = 'no_shows'
+SETTLE_DELAY = datetime.timedelta(hours=6)
+ROLLUP_WINDOW = datetime.timedelta(days=7)
+MIN_TICKETS = 200
+Z = 1.96
+CACHE_PREFIX = 'ferry:overbooking:'
+CACHE_TIMEOUT = 6 * 60 * 60
+WARM_HORIZON = datetime.timedelta(days=60)
+# Seconds an allowance is used from process memory, and how many are kept
+LOCAL_TIMEOUT = 5 * 60
+MAX_LOCAL = 50_000
+
+# {schedule_id: (allowance, monotonic expiry)}
+_local = {}
+_local_lock = threading.Lock()
+
+
+def max_overbooking():
+    return getattr(settings, 'MAX_OVERBOOKING', 0.10)
+
+
+def slot(departure_time):
+    """``(weekday, hour)`` of a departure in the current time zone."""
+    local = timezone.localtime(departure_time)
+    return local.weekday(), local.hour
+
+
+def no_show_lower_bound(no_shows, tickets):
+    """Lower bound of the Wilson score interval for the no-show rate."""
+    if not tickets:
+        return 0.0
+    p = no_shows / tickets
+    denominator = 1 + Z * Z / tickets
+    centre = p + Z * Z / (2 * tickets)
+    margin = Z * math.sqrt(p * (1 - p) / tickets + Z * Z / (4 * tickets * tickets))
+    return max((centre - margin) / denominator, 0.0)
+
+
+def _slot_counts(start, end):
+    """Grouped counts of the tickets of checked-in sailings departing in ``(start, end]``."""
+    departed = {'schedule__departure_time__gt': start, 'schedule__departure_time__lte': end}
+    checked_in = Ticket.objects.filter(ticket_status='USED', **departed).values('schedule_id')
+    return (
+        Ticket.objects.filter(
+            ticket_status__in=['ACTIVE', 'USED'],
+            schedule_id__in=checked_in,
+            **departed,
+        )
+        .annotate(
+            weekday=ExtractIsoWeekDay('schedule__departure_time'),
+            hour=ExtractHour('schedule__departure_time'),
+        )
+        .order_by()
+        .values('schedule__route_id', 'weekday', 'hour')
+        .annotate(
+            sailings=Count('schedule_id', distinct=True),
+            tickets=Count('ticket_id'),
+            no_shows=Count('ticket_id', filter=Q(ticket_status='ACTIVE')),
+        )
+        .values_list('schedule__route_id', 'weekday', 'hour', 'sailings', 'tickets', 'no_shows')
+    )
+
+
+def _add_counts(rows, now):
+    """Add grouped counts to their rollup rows. Returns the ``(route_id, weekday, hour)`` keys touched."""
+    counts = {
+        (route_id, weekday - 1, hour): (sailings, tickets, no_shows)
+        for route_id, weekday, hour, sailings, tickets, no_shows in rows
+    }
+    if not counts:
+        return set()
+    existing = {
+        (rollup.route_id, rollup.weekday, rollup.hour): rollup
+        for rollup in NoShowRollup.objects.filter(route_id__in={key[0] for key in counts})
+        if (rollup.route_id, rollup.weekday, rollup.hour) in counts
+    }
+    created = []
+    for key, (sailings, tickets, no_shows) in counts.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(NoShowRollup(
+                route_id=key[0], weekday=key[1], hour=key[2],
+                sailings=sailings, tickets=tickets, no_shows=no_shows, updated_at=now,
+            ))
+            continue
+        rollup.sailings += sailings
+        rollup.tickets += tickets
+        rollup.no_shows += no_shows
+        rollup.updated_at = now
+    NoShowRollup.objects.bulk_update(existing.values(), ['sailings', 'tickets', 'no_shows', 'updated_at'])
+    NoShowRollup.objects.bulk_create(created)
+    return set(counts)
+
+
+def rollup_no_shows(now=None, window=ROLLUP_WINDOW):
+    """
+    Count sailings that settled since the last run into ``NoShowRollup``.
+    Returns a dict of counts. Each window commits with the watermark, so an
+    interrupted run resumes where it stopped.
+    """
+    now = now or timezone.now()
+    cutoff = now - SETTLE_DELAY
+    stats = {'windows': 0, 'slots': 0, 'warmed': 0}
+    if not RollupWatermark.objects.filter(name=WATERMARK).exists():
+        first = Schedule.objects.aggregate(first=Min('departure_time'))['first']
+        if first is None:
+            return stats
+        RollupWatermark.objects.get_or_create(
+            name=WATERMARK, defaults={'position': first - datetime.timedelta(seconds=1)},
+        )
+
+    slots = set()
+    while True:
+        with transaction.atomic():
+            # Serializes concurrent runs; the loser counts nothing twice
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            if watermark.position >= cutoff:
+                break
+            end = min(watermark.position + window, cutoff)
+            slots |= _add_counts(_slot_counts(watermark.position, end), now)
+            watermark.position = end
+            watermark.updated_at = now
+            watermark.save(update_fields=['position', 'updated_at'])
+        stats['windows'] += 1
+    stats['slots'] = len(slots)
+    stats['warmed'] = warm_upcoming(now)
+    return stats
+
+
+def allowances(schedule_ids):
+    """``{schedule_id: overbooking allowance}`` computed from the rollups (two queries)."""
+    schedules = list(
+        Schedule.objects.filter(schedule_id__in=schedule_ids).values_list('schedule_id', 'route_id', 'departure_time')
+    )
+    slots, routes = {}, {}
+    for route_id, weekday, hour, tickets, no_shows in NoShowRollup.objects.filter(
+        route_id__in={route_id for _, route_id, _ in schedules}
+    ).values_list('route_id', 'weekday', 'hour', 'tickets', 'no_shows'):
+        slots[route_id, weekday, hour] = (tickets, no_shows)
+        route_tickets, route_no_shows = routes.get(route_id, (0, 0))
+        routes[route_id] = (route_tickets + tickets, route_no_shows + no_shows)
+
+    cap = max_overbooking()
+    result = {}
+    for schedule_id, route_id, departure_time in schedules:
+        tickets, no_shows = slots.get((route_id, *slot(departure_time)), (0, 0))
+        if tickets < MIN_TICKETS:
+            tickets, no_shows = routes.get(route_id, (0, 0))
+        rate = no_show_lower_bound(no_shows, tickets) if tickets >= MIN_TICKETS else 0.0
+        result[schedule_id] = round(min(rate, cap), 4)
+    return result
+
+
+def _remember(values):
+    expires = time.monotonic() + LOCAL_TIMEOUT
+    with _local_lock:
+        if len(_local) + len(values) > MAX_LOCAL:
+            now = time.monotonic()
+            for pk in [pk for pk, (_, until) in _local.items() if until <= now]:
+                del _local[pk]
+            if len(_local) + len(values) > MAX_LOCAL:
+                _local.clear()
+        _local.update((pk, (value, expires)) for pk, value in list(values.items())[:MAX_LOCAL])
+
+
+def warm(schedule_ids):
+    """Compute and cache the allowances of ``schedule_ids``."""
+    values = allowances(schedule_ids)
+    cache.set_many({f"{CACHE_PREFIX}{pk}": value for pk, value in values.items()}, CACHE_TIMEOUT)
+    _remember(values)
+    return values
+
+
+def warm_upcoming(now=None, horizon=WARM_HORIZON):
+    """Cache the allowances of sailings departing within ``horizon``. Returns how many."""
+    now = now or timezone.now()
+    schedule_ids = list(
+        Schedule.objects.filter(departure_time__gte=now, departure_time__lt=now + horizon)
+        .values_list('schedule_id', flat=True)
+    )
+    for start in range(0, len(schedule_ids), 1000):
+        warm(schedule_ids[start:start + 1000])
+    return len(schedule_ids)
+
+
+def sellable_capacities(capacities):
+    """
+    ``{schedule_id: sellable capacity}`` for a ``{schedule_id: physical
+    capacity}`` dict. Allowances held in process memory cost no query.
+    """
+    if not capacities:
+        return {}
+    now = time.monotonic()
+    values = {}
+    for pk in capacities:
+        entry = _local.get(pk)
+        if entry is not None and entry[1] > now:
+            values[pk] = entry[0]
+    missing = [pk for pk in capacities if pk not in values]
+    if missing:
+        cached = cache.get_many([f"{CACHE_PREFIX}{pk}" for pk in missing])
+        shared = {pk: cached[f"{CACHE_PREFIX}{pk}"] for pk in missing if f"{CACHE_PREFIX}{pk}" in cached}
+        _remember(shared)
+        values.update(shared)
+        missing = [pk for pk in missing if pk not in shared]
+    if missing:
+        values.update(warm(missing))
+    return {
+        pk: capacity + math.floor(capacity * values.get(pk, 0.0))
+        for pk, capacity in capacities.items()
+    }
+
+
+def sellable_capacity(schedule_id, capacity):
+    """Seats that may be sold on a sailing whose ferry has ``capacity`` seats."""
+    return sellable_capacities({schedule_id: capacity})[schedule_id]
+
+
+def sellable_seats_left(rows):
+    """``{schedule_id: seats left}`` against sellable capacity for ``queries.seat_availability`` rows."""
+    rows = list(rows)
+    sellable = sellable_capacities({schedule_id: capacity for schedule_id, capacity, _, _ in rows})
+    return {schedule_id: sellable[schedule_id] - sold for schedule_id, _, sold, _ in rows}
@@ -0,0 +1,313 @@
+"""
+Boarding check-in against an in-memory manifest.
+
+A ``CheckInSession`` loads the ids of the boardable tickets of one sailing
+with a single query and validates scans against hash sets, so unknown
+tickets and repeated scans are rejected without touching the database. An
+accepted scan is appended to a local journal file (``CHECKIN_JOURNAL_DIR``)
+and kept pending in memory; scanning keeps working while the database is
+unreachable.
+
+A flusher thread per process writes pending scans every ``FLUSH_DELAY`` (or
+as soon as ``FLUSH_SIZE`` are pending) with one ``bulk_create`` of
+``BoardingScan`` rows, then marks their tickets USED in batched
+``UPDATE ... WHERE ticket_id IN (...)`` statements. The primary key of
+``BoardingScan`` is the ticket, so a ticket scanned by two web processes
+between manifest reloads is detected at flush time: it is logged and listed
+as a conflict in the manifest snapshot. A failed flush keeps its scans
+pending; a process that dies before flushing leaves its journal, which the
+next session of the sailing adopts. Sessions are kept per process (see
+``get_session``) and dropped ``EVICT_AFTER`` the departure of their sailing
+once their scans are written.
+"""
+
+import datetime
+import glob
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import audit
+from .jobs import worker_name
+from .models import BoardingScan, Schedule, Ticket
+
+logger = logging.getLogger(__name__)
+
+OK = 'OK'
+DUPLICATE = 'DUPLICATE'
+INVALID = 'INVALID'
+
+FLUSH_SIZE = 200
+FLUSH_DELAY = datetime.timedelta(minutes=1)
+EVICT_AFTER = datetime.timedelta(hours=1)
+
+
+def flush_scans(schedule_id, batch_size=FLUSH_SIZE):
+    """
+    Write the unflushed scans of a sailing, recorded by any process, as USED
+    tickets. Each batch commits on its own; a failed batch stays unflushed.
+    Returns the number of tickets updated.
+    """
+    updated = 0
+    while True:
+        with transaction.atomic():
+            scanned = list(
+                BoardingScan.objects.select_for_update(skip_locked=True)
+                .filter(schedule_id=schedule_id, flushed_at__isnull=True)
+                .values_list('ticket_id', flat=True)[:batch_size]
+            )
+            if not scanned:
+                return updated
+            boarded = list(
+                Ticket.objects.select_for_update()
+                .filter(ticket_id__in=scanned, ticket_status='ACTIVE')
+                .values_list('ticket_id', flat=True)
+            )
+            updated += Ticket.objects.filter(ticket_id__in=boarded).update(ticket_status='USED')
+            audit.record_many('ticket', ((pk, 'ACTIVE') for pk in boarded), 'ticket_status', 'USED', 'checkin')
+            BoardingScan.objects.filter(ticket_id__in=scanned).update(flushed_at=timezone.now())
+
+
+def _journal_dir():
+    return getattr(settings, 'CHECKIN_JOURNAL_DIR', None)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class CheckInSession:
+    def __init__(self, schedule_id, flush_size=FLUSH_SIZE):
+        self.schedule_id = schedule_id
+        self.flush_size = flush_size
+        self.valid = set()
+        self.used = set()
+        # (ticket_id, scanned_at) accepted by this process and not written yet
+        self.pending = []
+        # Tickets this process let board that another process had scanned first
+        self.conflicts = set()
+        self.departure_time = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        # Serializes flushes of this session between the flusher and close_session
+        self._flush_lock = threading.Lock()
+        directory = _journal_dir()
+        self.journal_path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            host, pid = worker_name().rsplit(':', 1)
+            self.journal_path = os.path.join(directory, f"schedule-{schedule_id}.{host}.{pid}.log")
+
+    def _adopt_journals(self):
+        """Take over the journaled, unwritten scans of processes on this host that died."""
+        if not self.journal_path:
+            return []
+        host = worker_name().rsplit(':', 1)[0]
+        adopted = []
+        pattern = os.path.join(os.path.dirname(self.journal_path), f"schedule-{self.schedule_id}.{host}.*.log")
+        for path in glob.glob(pattern):
+            pid = path.rsplit('.', 2)[-2]
+            if path == self.journal_path or not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            scans = []
+            with open(path) as stream:
+                for line in stream:
+                    ticket_id, _, scanned_at = line.strip().partition(' ')
+                    scanned_at = parse_datetime(scanned_at)
+                    if ticket_id.isdigit() and scanned_at:
+                        scans.append((int(ticket_id), scanned_at))
+            self._journal(scans)
+            os.remove(path)
+            adopted.extend(scans)
+        return adopted
+
+    def _journal(self, scans):
+        if self.journal_path and scans:
+            with open(self.journal_path, 'a') as stream:
+                stream.writelines(f"{ticket_id} {scanned_at.isoformat()}\n" for ticket_id, scanned_at in scans)
+                stream.flush()
+                os.fsync(stream.fileno())
+
+    def _rewrite_journal(self):
+        """Keep only the still pending scans in the journal. Call with ``_lock`` held."""
+        if not self.journal_path:
+            return
+        if not self.pending:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        with open(self.journal_path + '.tmp', 'w') as stream:
+            stream.writelines(f"{ticket_id} {scanned_at.isoformat()}\n" for ticket_id, scanned_at in self.pending)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(self.journal_path + '.tmp', self.journal_path)
+
+    def load(self):
+        """(Re)load the manifest snapshot, including scans written by other processes."""
+        departure_time = (
+            Schedule.objects.filter(schedule_id=self.schedule_id).values_list('departure_time', flat=True).first()
+        )
+        rows = (
+            Ticket.objects.filter(schedule_id=self.schedule_id, ticket_status__in=['ACTIVE', 'USED'])
+            .annotate(scanned=Exists(BoardingScan.objects.filter(ticket_id=OuterRef('ticket_id'))))
+            .values_list('ticket_id', 'ticket_status', 'scanned')
+        )
+        valid, used = set(), set()
+        for ticket_id, status, scanned in rows.iterator(chunk_size=5000):
+            (used if status == 'USED' or scanned else valid).add(ticket_id)
+        with self._lock:
+            if self.loaded_at is None:
+                self.pending.extend(self._adopt_journals())
+            self.valid = valid
+            self.used = used | {ticket_id for ticket_id, _ in self.pending}
+            self.departure_time = departure_time
+            self.loaded_at = timezone.now()
+        return self
+
+    def scan(self, ticket_id):
+        """Validate one scan in memory. Returns OK, DUPLICATE or INVALID."""
+        with self._lock:
+            if ticket_id in self.used:
+                return DUPLICATE
+            if ticket_id not in self.valid:
+                return INVALID
+            scan = (ticket_id, timezone.now())
+            self._journal([scan])
+            self.used.add(ticket_id)
+            self.pending.append(scan)
+            full = len(self.pending) >= self.flush_size
+        if full:
+            _flusher.wake()
+        return OK
+
+    def flush(self):
+        """
+        Write pending scans as BoardingScan rows and their tickets as USED.
+        Returns the number of tickets updated; raises DatabaseError and keeps
+        the scans pending if the database cannot be written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self.pending)
+            if batch:
+                ticket_ids = [ticket_id for ticket_id, _ in batch]
+                with transaction.atomic():
+                    # A row with another scan time was written by another process
+                    # (one with ours is a retry of a flush that committed)
+                    existing = dict(
+                        BoardingScan.objects.filter(ticket_id__in=ticket_ids).values_list('ticket_id', 'scanned_at')
+                    )
+                    BoardingScan.objects.bulk_create(
+                        [
+                            BoardingScan(ticket_id=ticket_id, schedule_id=self.schedule_id, scanned_at=scanned_at)
+                            for ticket_id, scanned_at in batch if ticket_id not in existing
+                        ],
+                        batch_size=1000, ignore_conflicts=True,
+                    )
+                conflicts = {
+                    ticket_id for ticket_id, scanned_at in batch
+                    if ticket_id in existing and existing[ticket_id] != scanned_at
+                }
+                if conflicts:
+                    logger.warning("Tickets %s of schedule %s were also scanned by another process",
+                                   sorted(conflicts), self.schedule_id)
+                with self._lock:
+                    self.conflicts |= conflicts
+                    del self.pending[:len(batch)]
+                    self._rewrite_journal()
+            return flush_scans(self.schedule_id, self.flush_size)
+
+    def snapshot(self):
+        """JSON-serializable manifest for gate devices to validate offline."""
+        with self._lock:
+            return {
+                'schedule_id': self.schedule_id,
+                'loaded_at': self.loaded_at,
+                'valid': sorted(self.valid - self.used),
+                'used': sorted(self.used),
+                'conflicts': sorted(self.conflicts),
+            }
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class _Flusher:
+    """Daemon thread that flushes every session of this process each ``FLUSH_DELAY``."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='checkin-flusher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(FLUSH_DELAY.total_seconds())
+            self._wakeup.clear()
+            close_old_connections()
+            with _sessions_lock:
+                sessions = list(_sessions.values())
+            for session in sessions:
+                if not session.pending:
+                    continue
+                try:
+                    session.flush()
+                except DatabaseError:
+                    logger.exception("Flushing check-in scans of schedule %s failed; retrying in %s",
+                                     session.schedule_id, FLUSH_DELAY)
+            close_old_connections()
+
+
+_flusher = _Flusher()
+
+
+def get_session(schedule_id):
+    """The process-wide check-in session of a sailing, loading it on first use."""
+    cutoff = timezone.now() - EVICT_AFTER
+    with _sessions_lock:
+        # Sessions of departed sailings are dropped once their scans are written
+        for departed in [
+            pk for pk, session in _sessions.items()
+            if session.departure_time is not None and session.departure_time < cutoff and not session.pending
+        ]:
+            del _sessions[departed]
+        session = _sessions.get(schedule_id)
+        if session is None:
+            session = _sessions[schedule_id] = CheckInSession(schedule_id).load()
+    _flusher.start()
+    return session
+
+
+def close_session(schedule_id):
+    """Write every scan of a sailing and forget its session. Returns the number of tickets flushed."""
+    with _sessions_lock:
+        session = _sessions.get(schedule_id)
+    if session is None:
+        return flush_scans(schedule_id)
+    updated = session.flush()
+    with _sessions_lock:
+        if not session.pending:
+            _sessions.pop(schedule_id, None)
+    return updated
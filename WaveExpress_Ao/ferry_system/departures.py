@@ -0,0 +1,88 @@
+"""
+Maintenance of the materialized upcoming-departures table.
+
+The home page lists upcoming sailings from ``UpcomingDeparture`` with a single
+indexed read instead of joining Schedule, Route, Port, Ferry and Ticket on
+every request. The table only holds sailings within ``HORIZON`` from now
+that have not been cancelled.
+
+A sailing's row is refreshed by a background job whenever its schedule is
+saved or a ticket on it is sold, cancelled or moved (``queue_refresh``), so
+``seats_left`` follows sales without a per-request count. It is counted
+against the sellable capacity (ferry_system.capacity), like search.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .capacity import sellable_capacities
+from .jobs import enqueue
+from .models import Schedule, UpcomingDeparture
+from .utilization import tickets_sold_subquery
+
+HORIZON = datetime.timedelta(days=14)
+
+
+def _summaries(schedules, refreshed_at):
+    rows = list(
+        schedules.filter(cancelled=False)
+        .annotate(tickets_sold=tickets_sold_subquery())
+        .order_by()
+        .values_list(
+            'schedule_id', 'departure_time', 'arrival_time', 'route__route_name',
+            'route__departure_port__port_name', 'route__arrival_port__port_name',
+            'ferry__ferry_name', 'price', 'reserve', 'ferry__capacity', 'tickets_sold',
+        )
+    )
+    sellable = sellable_capacities({row[0]: row[9] for row in rows})
+    return [
+        UpcomingDeparture(
+            schedule_id=schedule_id,
+            departure_time=departure_time,
+            arrival_time=arrival_time,
+            route_name=route_name,
+            departure_port_name=departure_port_name,
+            arrival_port_name=arrival_port_name,
+            ferry_name=ferry_name,
+            price=price,
+            reserve=reserve,
+            seats_left=max(sellable[schedule_id] - sold, 0),
+            refreshed_at=refreshed_at,
+        )
+        for (schedule_id, departure_time, arrival_time, route_name, departure_port_name,
+             arrival_port_name, ferry_name, price, reserve, capacity, sold) in rows
+    ]
+
+
+def refresh_upcoming_departures(horizon=HORIZON):
+    """Rebuild the whole table. Returns the number of sailings it now holds."""
+    now = timezone.now()
+    summaries = _summaries(
+        Schedule.objects.filter(departure_time__gte=now, departure_time__lt=now + horizon), now,
+    )
+    with transaction.atomic():
+        UpcomingDeparture.objects.all().delete()
+        UpcomingDeparture.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
+
+
+def refresh_departure(schedule_id, horizon=HORIZON):
+    """Refresh (or drop) the summary row of one sailing after it changed."""
+    now = timezone.now()
+    summaries = _summaries(
+        Schedule.objects.filter(
+            schedule_id=schedule_id, departure_time__gte=now, departure_time__lt=now + horizon,
+        ),
+        now,
+    )
+    with transaction.atomic():
+        UpcomingDeparture.objects.filter(schedule_id=schedule_id).delete()
+        UpcomingDeparture.objects.bulk_create(summaries)
+
+
+def queue_refresh(schedule_ids):
+    """Refresh the rows of ``schedule_ids`` in the background once the current transaction commits."""
+    for schedule_id in schedule_ids:
+        enqueue('refresh_departure', {'schedule_id': schedule_id}, dedupe_key=f"refresh_departure:{schedule_id}")
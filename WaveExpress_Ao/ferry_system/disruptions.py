@@ -0,0 +1,143 @@
+"""
+Bulk cancellation of disrupted sailings.
+
+Cancelling a sailing touches every ticket, reservation and payment booked on
+it. Instead of saving each object (and running its ``clean()``), the status
+changes are applied with set-based ``UPDATE`` statements and the refund
+payments are written with a single ``bulk_create``, all inside one
+transaction. The status changes are recorded in the booking audit log.
+
+The sailings themselves are locked and flagged ``cancelled`` first, in the
+same transaction, so bookings (which lock the schedule row before selling a
+seat) either commit before the cancellation or see the flag and fail.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import audit
+from .departures import queue_refresh
+from .models import Payment, Reservation, Schedule, Ticket, WaitlistEntry
+from .rebooking import rebook_passengers
+from .tokens import revoke
+
+
+def disrupted_schedules(schedule_ids=None, route=None, start=None, end=None):
+    """
+    Schedules matching either explicit ids, or a route and/or a departure window.
+    """
+    if not schedule_ids and route is None and start is None and end is None:
+        raise ValueError("Select sailings by schedule id, route or departure window.")
+    schedules = Schedule.objects.all()
+    if schedule_ids:
+        schedules = schedules.filter(schedule_id__in=schedule_ids)
+    if route is not None:
+        schedules = schedules.filter(route=route)
+    if start is not None:
+        schedules = schedules.filter(departure_time__gte=start)
+    if end is not None:
+        schedules = schedules.filter(departure_time__lt=end)
+    return schedules
+
+
+def cancel_sailings(schedules, rebook=False, batch_size=1000):
+    """
+    Cancel ``schedules`` with every booking on them and refund completed payments.
+
+    The sailings are marked cancelled; tickets, reservations and open
+    waitlist entries are flipped to CANCELLED, ticket payment status PAID
+    becomes REFUNDED, every completed payment gets a REFUNDED refund row
+    pointing back at it (the original stays COMPLETED, so sums per status
+    count each amount once, and it is never refunded twice) and pending
+    payments are marked FAILED.
+
+    With ``rebook``, active tickets are first moved to later sailings
+    between the same ports (see ferry_system.rebooking) inside the same
+    transaction, after the sailings are locked, so no ticket can be sold on
+    them in between and a failure leaves nobody moved off a live sailing.
+    Returns a dict of counts.
+    """
+    with transaction.atomic():
+        schedule_ids = list(
+            schedules.order_by('schedule_id').select_for_update(of=('self',))
+            .values_list('schedule_id', flat=True)
+        )
+        Schedule.objects.filter(schedule_id__in=schedule_ids).update(cancelled=True)
+        rebooked = None
+        if rebook:
+            rebooked = rebook_passengers(
+                Ticket.objects.filter(schedule_id__in=schedule_ids), exclude_schedule_ids=schedule_ids,
+            )
+        tickets = Ticket.objects.filter(schedule_id__in=schedule_ids)
+        reservations = Reservation.objects.filter(schedule_id__in=schedule_ids)
+        payments = Payment.objects.filter(
+            Q(ticket__in=tickets.values('ticket_id')) | Q(reservation__in=reservations.values('reservation_id'))
+        )
+
+        completed = list(
+            payments.filter(payment_status='COMPLETED', refund__isnull=True)
+            .select_for_update(of=('self',))
+            .values_list('payment_id', 'amount', 'payment_method', 'ticket_id', 'reservation_id')
+        )
+        refunds = [
+            Payment(
+                amount=amount,
+                payment_method=method,
+                payment_status='REFUNDED',
+                transaction_reference=f"REFUND-{payment_id}",
+                refund_of_id=payment_id,
+                ticket_id=ticket_id,
+                reservation_id=reservation_id,
+            )
+            for payment_id, amount, method, ticket_id, reservation_id in completed
+        ]
+
+        # Lock the affected rows and keep their old values for the audit log;
+        # the set-based updates below then touch exactly these rows
+        pending = list(payments.filter(payment_status='PENDING').select_for_update().values_list('payment_id', flat=True))
+        ticket_rows = list(
+            tickets.select_for_update().values_list('ticket_id', 'ticket_status', 'payment_status', 'schedule_id')
+        )
+        reservation_rows = list(
+            reservations.exclude(status='CANCELLED').select_for_update().values_list('reservation_id', 'status')
+        )
+
+        payments_voided = payments.filter(payment_status='PENDING').update(payment_status='FAILED')
+        Payment.objects.bulk_create(refunds, batch_size=batch_size)
+
+        tickets_refunded = tickets.filter(payment_status='PAID').update(payment_status='REFUNDED')
+        tickets_cancelled = tickets.exclude(ticket_status='CANCELLED').update(ticket_status='CANCELLED')
+        reservations_cancelled = reservations.exclude(status='CANCELLED').update(status='CANCELLED')
+        waitlist_cancelled = WaitlistEntry.objects.filter(
+            schedule_id__in=schedule_ids, status__in=['WAITING', 'HELD'],
+        ).update(status='CANCELLED')
+
+        source = 'cancel_sailings'
+        audit.record_many('payment', ((pk, 'PENDING') for pk in pending), 'payment_status', 'FAILED', source)
+        audit.record_many('ticket', ((pk, status) for pk, status, _, _ in ticket_rows), 'ticket_status', 'CANCELLED', source)
+        audit.record_many(
+            'ticket', ((pk, paid) for pk, _, paid, _ in ticket_rows if paid == 'PAID'), 'payment_status', 'REFUNDED', source,
+        )
+        revoke((pk, schedule_id) for pk, status, _, schedule_id in ticket_rows if status != 'CANCELLED')
+        audit.record_many('reservation', reservation_rows, 'status', 'CANCELLED', source)
+        # bulk_create does not return primary keys on MySQL
+        refund_ids = Payment.objects.filter(refund_of_id__in=[row[0] for row in completed]).values_list(
+            'payment_id', flat=True,
+        )
+        audit.record_created('payment', ((pk, {'payment_status': 'REFUNDED'}) for pk in refund_ids), source)
+        queue_refresh(schedule_ids)
+
+    return {
+        'schedules': len(schedule_ids),
+        'schedule_ids': schedule_ids,
+        'tickets_cancelled': tickets_cancelled,
+        'tickets_refunded': tickets_refunded,
+        'reservations_cancelled': reservations_cancelled,
+        'waitlist_cancelled': waitlist_cancelled,
+        'payments_refunded': len(refunds),
+        'payments_voided': payments_voided,
+        'refund_total': sum((row[1] for row in completed), Decimal('0')),
+        'rebooking': rebooked,
+    }
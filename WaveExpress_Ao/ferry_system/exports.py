@@ -0,0 +1,315 @@
+"""
+Columnar export of booking facts for offline analysis.
+
+Each fact row is one ticket joined with its sailing (route, ferry, departure
+time, price) and its payment totals. Rows are read in keyset-paginated
+chunks (``ticket_id > last ORDER BY ticket_id LIMIT n``) rather than one
+streaming cursor: mysqlclient buffers whole result sets on the client, while
+an indexed range per chunk keeps memory flat on every backend.
+
+Rows are partitioned by departure month into ``month=YYYY-MM`` directories
+and written as Parquet when pyarrow is installed, otherwise as compressed
+NumPy ``.npz`` (decimals in cents) or gzip CSV. Each run writes new part
+files and records a watermark (highest ticket id and booking event id) in
+``_watermark.json``; the next run exports only new tickets and tickets whose
+status or payments changed since, so readers keep the row with the latest
+``exported_at`` per ticket.
+
+Ids are assigned at insert but become visible at commit, so a run can see
+id ``n + 1`` before a slower transaction commits id ``n``. Each run records
+the ticket and event ids it found missing within ``LOOKBACK_IDS`` below its
+high-water marks (``ticket_gaps`` and ``event_gaps`` in the watermark), and
+the next run exports those that have committed since. Gaps that fall further
+behind are rolled back or deleted rows and are forgotten, so a run with
+nothing new exports nothing.
+"""
+
+import csv
+import decimal
+import gzip
+import importlib
+import importlib.util
+import json
+import os
+from collections import defaultdict
+
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .models import BookingEvent, Payment, Ticket
+
+WATERMARK_FILE = '_watermark.json'
+# Ids below a high-water mark that a later run still checks for late commits
+LOOKBACK_IDS = 10_000
+CHUNK_SIZE = 50_000
+PART_ROWS = 500_000
+
+# (column, kind) in file order; kinds drive the type mapping of each writer
+COLUMNS = [
+    ('ticket_id', 'int'),
+    ('schedule_id', 'int'),
+    ('route_id', 'int'),
+    ('ferry_id', 'int'),
+    ('passenger_id', 'int'),
+    ('departure_time', 'datetime'),
+    ('purchase_date', 'datetime'),
+    ('ticket_status', 'str'),
+    ('payment_status', 'str'),
+    ('seat_number', 'str'),
+    ('price', 'decimal'),
+    ('amount_paid', 'decimal'),
+    ('amount_refunded', 'decimal'),
+    ('exported_at', 'datetime'),
+]
+
+_QUERY_FIELDS = [
+    'ticket_id', 'schedule_id', 'schedule__route_id', 'schedule__ferry_id', 'passenger_id',
+    'schedule__departure_time', 'purchase_date', 'ticket_status', 'payment_status', 'seat_number',
+    'schedule__price',
+]
+ZERO = decimal.Decimal('0.00')
+
+
+def available_formats():
+    # pyarrow and numpy take long to import, so they are only located here and
+    # imported by the writer that needs them
+    return [
+        name for name, module in (('parquet', 'pyarrow'), ('npz', 'numpy'), ('csv', None))
+        if module is None or importlib.util.find_spec(module) is not None
+    ]
+
+
+class ParquetWriter:
+    extension = 'parquet'
+
+    def __init__(self):
+        pa = self.pa = importlib.import_module('pyarrow')
+        self.parquet = importlib.import_module('pyarrow.parquet')
+        types = {
+            'int': pa.int64(),
+            'datetime': pa.timestamp('us', tz='UTC'),
+            'str': pa.string(),
+            'decimal': pa.decimal128(12, 2),
+        }
+        self.schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+    def write(self, path, columns):
+        table = self.pa.Table.from_pydict(columns, schema=self.schema)
+        self.parquet.write_table(table, path, compression='zstd')
+
+
+class NpzWriter:
+    extension = 'npz'
+
+    def __init__(self):
+        self.numpy = importlib.import_module('numpy')
+
+    def _array(self, kind, values):
+        numpy = self.numpy
+        if kind == 'int':
+            return numpy.array(values, dtype='int64')
+        if kind == 'datetime':
+            return numpy.array([value.replace(tzinfo=None) for value in values], dtype='datetime64[us]')
+        if kind == 'decimal':
+            return numpy.array([int(value * 100) for value in values], dtype='int64')
+        return numpy.array(['' if value is None else value for value in values], dtype='U')
+
+    def write(self, path, columns):
+        self.numpy.savez_compressed(path, **{name: self._array(kind, columns[name]) for name, kind in COLUMNS})
+
+
+class CsvWriter:
+    extension = 'csv.gz'
+
+    def write(self, path, columns):
+        values = [
+            [value.isoformat() for value in columns[name]] if kind == 'datetime' else columns[name]
+            for name, kind in COLUMNS
+        ]
+        with gzip.open(path, 'wt', newline='', encoding='utf-8', compresslevel=6) as stream:
+            writer = csv.writer(stream)
+            writer.writerow([name for name, _ in COLUMNS])
+            writer.writerows(zip(*values))
+
+
+WRITERS = {'parquet': ParquetWriter, 'npz': NpzWriter, 'csv': CsvWriter}
+
+
+def read_watermark(directory):
+    try:
+        with open(os.path.join(directory, WATERMARK_FILE)) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return None
+
+
+def _write_watermark(directory, watermark):
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(path + '.tmp', 'w') as stream:
+        json.dump(watermark, stream)
+    os.replace(path + '.tmp', path)
+
+
+def missing_ids(after, ids, until, floor):
+    """Ids in ``(max(after, floor), until]`` that are not in the ascending ``ids``."""
+    missing = []
+    last = max(after, floor)
+    for pk in ids:
+        if pk > last:
+            missing.extend(range(last + 1, pk))
+            last = pk
+    missing.extend(range(last + 1, until + 1))
+    return missing
+
+
+def changed_ticket_ids(after_event_id, until_event_id, late_event_ids=()):
+    """
+    Tickets whose status, sailing or payments changed in the booking events
+    between two event ids, or in the ``late_event_ids`` below them.
+    """
+    events = BookingEvent.objects.filter(
+        Q(event_id__gt=after_event_id, event_id__lte=until_event_id) | Q(event_id__in=list(late_event_ids))
+    )
+    ticket_ids = set(events.filter(entity_type='ticket').values_list('entity_id', flat=True))
+    payment_ids = events.filter(entity_type='payment').values_list('entity_id', flat=True)
+    ticket_ids.update(
+        Payment.objects.filter(payment_id__in=payment_ids, ticket__isnull=False).values_list('ticket_id', flat=True)
+    )
+    return sorted(ticket_ids)
+
+
+class BookingExporter:
+    def __init__(self, directory, format=None, chunk_size=CHUNK_SIZE, part_rows=PART_ROWS):
+        format = format or available_formats()[0]
+        if format not in available_formats():
+            raise ValueError(f"Format {format!r} is not available; install pyarrow or numpy, or use csv.")
+        self.directory = directory
+        self.format = format
+        self.writer = WRITERS[format]()
+        self.chunk_size = chunk_size
+        self.part_rows = part_rows
+        self.exported_at = timezone.now()
+        self.run = self.exported_at.strftime('%Y%m%dT%H%M%S')
+        self.buffers = defaultdict(lambda: defaultdict(list))
+        self.parts = defaultdict(int)
+        self.stats = {'rows': 0, 'new': 0, 'changed': 0, 'files': 0}
+        self.ticket_gaps = []
+
+    def _payment_totals(self, ticket_ids):
+        return {
+            row['ticket_id']: (row['paid'] or ZERO, row['refunded'] or ZERO)
+            for row in Payment.objects.filter(ticket_id__in=ticket_ids).order_by().values('ticket_id').annotate(
+                paid=Sum('amount', filter=Q(payment_status='COMPLETED')),
+                refunded=Sum('amount', filter=Q(payment_status='REFUNDED')),
+            )
+        }
+
+    def _add_rows(self, rows):
+        totals = self._payment_totals([row[0] for row in rows])
+        for row in rows:
+            paid, refunded = totals.get(row[0], (ZERO, ZERO))
+            values = row + (paid, refunded, self.exported_at)
+            month = values[5].strftime('%Y-%m')
+            buffer = self.buffers[month]
+            for (name, _), value in zip(COLUMNS, values):
+                buffer[name].append(value)
+            if len(buffer['ticket_id']) >= self.part_rows:
+                self._flush(month)
+        self.stats['rows'] += len(rows)
+
+    def _flush(self, month):
+        columns = self.buffers.pop(month, None)
+        if not columns:
+            return
+        partition = os.path.join(self.directory, f"month={month}")
+        os.makedirs(partition, exist_ok=True)
+        self.parts[month] += 1
+        path = os.path.join(partition, f"part-{self.run}-{self.parts[month]:04d}.{self.writer.extension}")
+        self.writer.write(path, columns)
+        self.stats['files'] += 1
+
+    def _tickets(self):
+        return Ticket.objects.order_by('ticket_id').values_list(*_QUERY_FIELDS)
+
+    def export_range(self, after_ticket_id, until_ticket_id):
+        """
+        Export tickets with ``after_ticket_id < ticket_id <= until_ticket_id``
+        in keyset chunks, noting the ids missing near the top in ``ticket_gaps``.
+        """
+        floor = until_ticket_id - LOOKBACK_IDS
+        last = after_ticket_id
+        while True:
+            rows = list(self._tickets().filter(ticket_id__gt=last, ticket_id__lte=until_ticket_id)[:self.chunk_size])
+            if not rows:
+                break
+            self._add_rows(rows)
+            self.stats['new'] += len(rows)
+            self.ticket_gaps.extend(missing_ids(last, [row[0] for row in rows], rows[-1][0], floor))
+            last = rows[-1][0]
+        self.ticket_gaps.extend(range(max(last, floor) + 1, until_ticket_id + 1))
+
+    def export_ids(self, ticket_ids, stat='changed'):
+        """Export the given tickets; returns the ids found."""
+        found = set()
+        for start in range(0, len(ticket_ids), self.chunk_size):
+            rows = list(self._tickets().filter(ticket_id__in=ticket_ids[start:start + self.chunk_size]))
+            self._add_rows(rows)
+            self.stats[stat] += len(rows)
+            found.update(row[0] for row in rows)
+        return found
+
+    def event_gaps(self, after_event_id, until_event_id):
+        """Booking event ids missing within ``LOOKBACK_IDS`` below ``until_event_id``."""
+        floor = max(after_event_id, until_event_id - LOOKBACK_IDS)
+        present = (
+            BookingEvent.objects.filter(event_id__gt=floor, event_id__lte=until_event_id)
+            .order_by('event_id').values_list('event_id', flat=True)
+        )
+        return missing_ids(floor, present.iterator(chunk_size=self.chunk_size), until_event_id, floor)
+
+    def run_export(self, full=False):
+        """Export everything (``full``) or what changed since the stored watermark."""
+        watermark = None if full else read_watermark(self.directory)
+        bounds = {
+            'ticket_id': Ticket.objects.aggregate(m=Max('ticket_id'))['m'] or 0,
+            'event_id': BookingEvent.objects.aggregate(m=Max('event_id'))['m'] or 0,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+
+        if watermark is None:
+            self.export_range(0, bounds['ticket_id'])
+            event_gaps = self.event_gaps(0, bounds['event_id'])
+        else:
+            # Tickets that committed after the last run read past their ids
+            old_gaps = watermark.get('ticket_gaps', [])
+            late = self.export_ids(old_gaps, stat='new')
+            self.export_range(watermark['ticket_id'], bounds['ticket_id'])
+            floor = bounds['ticket_id'] - LOOKBACK_IDS
+            self.ticket_gaps.extend(pk for pk in old_gaps if pk not in late and pk > floor)
+
+            old_event_gaps = watermark.get('event_gaps', [])
+            changed = [
+                pk for pk in changed_ticket_ids(watermark['event_id'], bounds['event_id'], old_event_gaps)
+                if pk <= watermark['ticket_id'] and pk not in late
+            ]
+            self.export_ids(changed)
+            late_events = set(
+                BookingEvent.objects.filter(event_id__in=old_event_gaps).values_list('event_id', flat=True)
+            )
+            event_floor = bounds['event_id'] - LOOKBACK_IDS
+            event_gaps = [pk for pk in old_event_gaps if pk not in late_events and pk > event_floor]
+            event_gaps += self.event_gaps(watermark['event_id'], bounds['event_id'])
+
+        for month in list(self.buffers):
+            self._flush(month)
+        _write_watermark(self.directory, {
+            **bounds, 'ticket_gaps': sorted(self.ticket_gaps), 'event_gaps': sorted(event_gaps),
+            'exported_at': self.exported_at.isoformat(), 'format': self.format,
+        })
+        return self.stats
+
+
+def export_bookings(directory, format=None, full=False, chunk_size=CHUNK_SIZE, part_rows=PART_ROWS):
+    """Write booking facts under ``directory``. Returns a dict of counts."""
+    exporter = BookingExporter(directory, format=format, chunk_size=chunk_size, part_rows=part_rows)
+    return exporter.run_export(full=full)
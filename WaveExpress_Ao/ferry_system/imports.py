@@ -0,0 +1,214 @@
+"""
+Streaming import of partner agency bookings.
+
+Rows (CSV with a header, or JSON lines) are read lazily and processed in
+chunks. For every chunk the passengers with matching emails are fetched in
+bulk; then, in one transaction, the referenced schedules are locked and
+their remaining sellable capacity (see ferry_system.capacity) and taken
+seats are counted, rows are validated in memory against them, and the new
+passengers and tickets are written with ``bulk_create``. Rejected rows are
+reported with their line number and reason instead of aborting the batch.
+
+Expected fields: ``email``, ``passenger_name``, ``schedule_id``, and
+optionally ``contact_number``, ``address``, ``seat_number`` and
+``payment_status`` (UNPAID or PAID).
+"""
+
+import csv
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Max
+
+from . import audit
+from .models import Passenger, Schedule, Ticket
+from .capacity import sellable_seats_left
+from .departures import queue_refresh
+from .queries import passengers_by_email, seat_availability
+from .routers import use_primary
+
+CHUNK_SIZE = 2000
+REJECT_FIELDS = ['line', 'error', 'row']
+
+
+def read_rows(stream, format='csv'):
+    """Yield ``(line_number, row)`` pairs from a text stream."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {'_raw': line.rstrip('\n')}
+    else:
+        raise ValueError(f"Unknown format: {format}")
+
+
+class BookingImporter:
+    def __init__(self, chunk_size=CHUNK_SIZE, reject_writer=None):
+        self.chunk_size = chunk_size
+        self.reject_writer = reject_writer
+        # Shared across chunks so each email is looked up once
+        self.passenger_ids = {}
+        # Counted for each chunk under the lock of its schedules
+        self.seats_left = {}
+        self.taken_seats = {}
+        self.stats = {'rows': 0, 'imported': 0, 'passengers_created': 0, 'rejected': 0}
+
+    def run(self, rows):
+        chunk = []
+        for line_number, row in rows:
+            chunk.append((line_number, row))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.stats
+
+    def reject(self, line_number, row, error):
+        self.stats['rejected'] += 1
+        if self.reject_writer is not None:
+            self.reject_writer.writerow({'line': line_number, 'error': error, 'row': json.dumps(row)})
+
+    def _prefetch_passengers(self, chunk):
+        emails = {str(row.get('email') or '').strip().lower() for _, row in chunk}
+        new_emails = emails - set(self.passenger_ids)
+        if new_emails:
+            for passenger_id, email in passengers_by_email(new_emails).order_by('-passenger_id').values_list(
+                'passenger_id', 'email'
+            ):
+                self.passenger_ids[email.lower()] = passenger_id
+
+    def _lock_schedules(self, chunk):
+        """
+        Lock the schedules of ``chunk`` until the end of the transaction and
+        count their seats left and taken seats, so tickets sold online since
+        the previous chunk are seen and none can be sold until this one commits.
+        """
+        schedule_ids = set()
+        for _, row in chunk:
+            try:
+                schedule_ids.add(int(row.get('schedule_id')))
+            except (TypeError, ValueError):
+                pass
+        list(
+            Schedule.objects.select_for_update(of=('self',))
+            .filter(schedule_id__in=schedule_ids)
+            .order_by('schedule_id')
+            .values_list('schedule_id', flat=True)
+        )
+        self.seats_left = sellable_seats_left(seat_availability(schedule_ids)) if schedule_ids else {}
+        self.taken_seats = {schedule_id: set() for schedule_id in self.seats_left}
+        for schedule_id, seat_number in (
+            Ticket.objects.filter(schedule_id__in=list(self.seats_left), seat_number__isnull=False)
+            .exclude(ticket_status='CANCELLED')
+            .values_list('schedule_id', 'seat_number')
+        ):
+            self.taken_seats[schedule_id].add(seat_number)
+
+    def _validate(self, row):
+        """Return ``(email, schedule_id, seat_number, payment_status)`` or raise ValidationError."""
+        if '_raw' in row:
+            raise ValidationError("Malformed row.")
+        email = str(row.get('email') or '').strip().lower()
+        validate_email(email)
+        if not str(row.get('passenger_name') or '').strip():
+            raise ValidationError("passenger_name is required.")
+        try:
+            schedule_id = int(row.get('schedule_id'))
+        except (TypeError, ValueError):
+            raise ValidationError("schedule_id must be an integer.")
+        if schedule_id not in self.seats_left:
+            raise ValidationError(f"Schedule {schedule_id} does not exist or was cancelled.")
+        if self.seats_left[schedule_id] <= 0:
+            raise ValidationError(f"Schedule {schedule_id} is sold out.")
+        seat_number = str(row.get('seat_number') or '').strip() or None
+        if seat_number is not None:
+            if len(seat_number) > 10:
+                raise ValidationError("seat_number is too long.")
+            if seat_number in self.taken_seats[schedule_id]:
+                raise ValidationError(f"Seat {seat_number} is already taken.")
+        payment_status = str(row.get('payment_status') or 'UNPAID').strip().upper()
+        if payment_status not in ('UNPAID', 'PAID'):
+            raise ValidationError("payment_status must be UNPAID or PAID.")
+        return email, schedule_id, seat_number, payment_status
+
+    def import_chunk(self, chunk):
+        self.stats['rows'] += len(chunk)
+        chunk_rows = [(line, row) for line, row in chunk if '_raw' not in row]
+        self._prefetch_passengers(chunk_rows)
+
+        with transaction.atomic():
+            self._lock_schedules(chunk_rows)
+            accepted = []
+            new_passengers = {}
+            for line_number, row in chunk:
+                try:
+                    email, schedule_id, seat_number, payment_status = self._validate(row)
+                except ValidationError as exc:
+                    self.reject(line_number, row, '; '.join(exc.messages))
+                    continue
+                self.seats_left[schedule_id] -= 1
+                if seat_number is not None:
+                    self.taken_seats[schedule_id].add(seat_number)
+                if email not in self.passenger_ids and email not in new_passengers:
+                    new_passengers[email] = Passenger(
+                        passenger_name=str(row['passenger_name']).strip()[:100],
+                        contact_number=str(row.get('contact_number') or '')[:20],
+                        address=str(row.get('address') or ''),
+                        email=email,
+                    )
+                accepted.append((email, schedule_id, seat_number, payment_status))
+
+            if new_passengers:
+                Passenger.objects.bulk_create(new_passengers.values(), batch_size=1000)
+                # bulk_create does not return primary keys on MySQL
+                for passenger_id, email in passengers_by_email(new_passengers).values_list('passenger_id', 'email'):
+                    self.passenger_ids.setdefault(email.lower(), passenger_id)
+                self.stats['passengers_created'] += len(new_passengers)
+            import_batch = uuid.uuid4().hex
+            tickets = [
+                Ticket(
+                    schedule_id=schedule_id,
+                    passenger_id=self.passenger_ids[email],
+                    seat_number=seat_number,
+                    payment_status=payment_status,
+                    import_batch=import_batch,
+                )
+                for email, schedule_id, seat_number, payment_status in accepted
+            ]
+            schedule_ids = sorted({schedule_id for _, schedule_id, _, _ in accepted})
+            last_id = Ticket.objects.aggregate(last=Max('ticket_id'))['last'] or 0
+            Ticket.objects.bulk_create(tickets, batch_size=1000)
+            if tickets and tickets[0].pk is None:
+                # No primary keys from bulk_create on MySQL: read back this chunk's
+                # rows by their batch marker (the id bound keeps it a range scan)
+                tickets = (
+                    Ticket.objects.filter(ticket_id__gt=last_id, import_batch=import_batch)
+                    .only(*audit.TRACKED_FIELDS['ticket'])
+                )
+            audit.record_created('ticket', ((ticket.pk, audit.snapshot(ticket)) for ticket in tickets), 'import')
+            queue_refresh(schedule_ids)
+        self.stats['imported'] += len(accepted)
+
+
+def import_bookings(stream, format='csv', reject_stream=None, chunk_size=CHUNK_SIZE):
+    """Import bookings from ``stream``, writing rejected rows as CSV to ``reject_stream``."""
+    reject_writer = None
+    if reject_stream is not None:
+        reject_writer = csv.DictWriter(reject_stream, fieldnames=REJECT_FIELDS)
+        reject_writer.writeheader()
+    importer = BookingImporter(chunk_size=chunk_size, reject_writer=reject_writer)
+    # Capacity and seat checks must see the tickets written by earlier chunks
+    with use_primary():
+        return importer.run(read_rows(stream, format=format))
@@ -0,0 +1,153 @@
+"""
+Database-backed background jobs.
+
+Views enqueue deferred side effects with ``enqueue()``, a single INSERT
+that commits with the surrounding transaction, and return immediately.
+``manage.py run_workers`` claims due jobs and runs them on a thread or
+process pool, retrying failures with exponential backoff. No broker is
+needed, so it runs on a single box next to the web server.
+
+Tasks are plain functions taking the job payload as keyword arguments,
+registered with ``@task('name')`` (see ``ferry_system.tasks``).
+"""
+
+import datetime
+import logging
+import os
+import random
+import socket
+import traceback
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import audit
+from .models import Job
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+STALE_AFTER = datetime.timedelta(minutes=15)
+HEARTBEAT_INTERVAL = datetime.timedelta(minutes=1)
+
+
+def task(name):
+    """Register a function as the task ``name``."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, dedupe_key=None, delay=None, max_attempts=5):
+    """
+    Queue ``name`` to run with ``payload``. Returns False when a job with the
+    same ``dedupe_key`` is already queued.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+    job = Job(
+        name=name,
+        payload=payload or {},
+        dedupe_key=dedupe_key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + (delay or datetime.timedelta()),
+    )
+    if dedupe_key is None:
+        job.save()
+        return True
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return False
+    return True
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: exponential with jitter, capped."""
+    seconds = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return datetime.timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_jobs(limit, worker=None):
+    """Mark up to ``limit`` due jobs as RUNNING for ``worker`` and return their ids."""
+    now = timezone.now()
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='QUEUED', run_after__lte=now)
+            .order_by('run_after')
+            .values_list('job_id', flat=True)[:limit]
+        )
+        if job_ids:
+            # Releasing the dedupe key lets changes made while the job runs
+            # queue a fresh run instead of being folded into this one
+            Job.objects.filter(job_id__in=job_ids).update(
+                status='RUNNING', locked_by=worker or worker_name(), locked_at=now, dedupe_key=None,
+            )
+    return job_ids
+
+
+def heartbeat(worker=None):
+    """Mark the RUNNING jobs of a live ``worker`` as still owned. Returns how many were touched."""
+    return Job.objects.filter(status='RUNNING', locked_by=worker or worker_name()).update(locked_at=timezone.now())
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    """
+    Give jobs of crashed workers back to the queue. Live workers refresh
+    ``locked_at`` every ``HEARTBEAT_INTERVAL`` (see ``heartbeat``), so only jobs
+    whose worker stopped beating for ``stale_after`` are requeued, however
+    long they run. Returns how many were requeued.
+    """
+    return Job.objects.filter(
+        status='RUNNING', locked_at__lt=timezone.now() - stale_after,
+    ).update(status='QUEUED', locked_by='', locked_at=None)
+
+
+def purge_finished_jobs(older_than=datetime.timedelta(days=7)):
+    return Job.objects.filter(
+        status__in=['DONE', 'FAILED'], finished_at__lt=timezone.now() - older_than,
+    ).delete()[0]
+
+
+def run_job(job_id):
+    """Run a claimed job and record the outcome. Returns the new job status."""
+    close_old_connections()
+    try:
+        # Jobs follow up on writes that may not have reached the replica yet
+        with use_primary():
+            job = Job.objects.get(job_id=job_id)
+            attempts = job.attempts + 1
+            try:
+                with audit.buffered():
+                    TASKS[job.name](**job.payload)
+            except Exception as exc:
+                logger.exception("Job %s (%s) failed", job.job_id, job.name)
+                error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+                if attempts >= job.max_attempts or job.name not in TASKS:
+                    Job.objects.filter(job_id=job_id).update(
+                        status='FAILED', attempts=attempts, last_error=error, finished_at=timezone.now(),
+                    )
+                    return 'FAILED'
+                Job.objects.filter(job_id=job_id).update(
+                    status='QUEUED', attempts=attempts, last_error=error,
+                    run_after=timezone.now() + backoff(attempts), locked_by='', locked_at=None,
+                )
+                return 'QUEUED'
+
+            Job.objects.filter(job_id=job_id).update(
+                status='DONE', attempts=attempts, finished_at=timezone.now(),
+            )
+            return 'DONE'
+    finally:
+        close_old_connections()
+
@@ -0,0 +1,461 @@
+"""
+Load generator for a ticket-sale rush.
+
+Virtual users walk the booking flow through the real application: they
+register, log out and log in again, open the home page, then repeatedly
+search sailings between two ports, check the availability of one, reserve a
+seat and pay for it, with an exponentially distributed think time between
+steps. Requests go through the full middleware stack (sessions, CSRF,
+throttling) of the ``WaveExpress_Ao.wsgi`` or ``asgi`` application in this
+process, or over HTTP to a running server.
+
+Latencies are recorded per step. For in-process runs every ``SELECT ... FOR
+UPDATE`` is timed, which is where payments queue on the schedule row lock,
+and lock errors (deadlocks, lock wait timeouts, ``database is locked``) are
+counted; on MySQL the InnoDB row-lock counters are sampled around the run.
+
+Every run registers new users and sells real tickets, so point it at a
+local database.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import datetime
+import http.client
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from .models import Schedule
+
+STEPS = ['register_form', 'register', 'logout', 'login_form', 'login', 'home',
+         'search', 'availability', 'reserve', 'pay']
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = [0.001 * 2 ** i for i in range(17)]
+LOCK_ERRORS = ('deadlock', 'lock wait timeout', 'database is locked', 'database table is locked')
+
+
+class WSGITransport:
+    """Calls the WSGI application in this process."""
+    name = 'wsgi'
+
+    def __init__(self, host='localhost'):
+        from WaveExpress_Ao.wsgi import application
+        self.application = application
+        self.host = host
+
+    def request(self, method, path, headers, body=b'', client='127.0.0.1'):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': client,
+            'HTTP_HOST': self.host,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else f"HTTP_{key}"] = value
+
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = response_headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], content
+
+
+class ASGITransport:
+    """Runs the ASGI application on an event loop thread in this process."""
+    name = 'asgi'
+
+    def __init__(self, host='localhost'):
+        from WaveExpress_Ao.asgi import application
+        self.application = application
+        self.host = host
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def request(self, method, path, headers, body=b'', client='127.0.0.1'):
+        future = asyncio.run_coroutine_threadsafe(self._request(method, path, headers, body, client), self.loop)
+        return future.result()
+
+    async def _request(self, method, path, headers, body, client):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode())] + [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()
+            ],
+            'client': (client, 0),
+            'server': (self.host, 80),
+        }
+        received = False
+        response = {'body': []}
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # The client never disconnects; Django cancels this once it responded
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [
+                    (name.decode('latin-1'), value.decode('latin-1')) for name, value in message['headers']
+                ]
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        return response['status'], response['headers'], b''.join(response['body'])
+
+
+class HTTPTransport:
+    """Sends requests to a running server, one keep-alive connection per thread."""
+    name = 'http'
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body=b'', client='127.0.0.1'):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, self.prefix + path, body=body or None, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.getheaders(), response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            raise
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.lock_waits = []
+        self.lock_errors = 0
+        self.bookings = 0
+
+    def record(self, step, seconds, outcome):
+        with self.lock:
+            self.latencies[step].append(seconds)
+            self.outcomes[step][outcome] += 1
+            if step == 'pay' and outcome == 'ok':
+                self.bookings += 1
+
+    def count(self, step, outcome):
+        with self.lock:
+            self.outcomes[step][outcome] += 1
+
+    def record_lock_wait(self, seconds):
+        with self.lock:
+            self.lock_waits.append(seconds)
+
+    def record_lock_error(self):
+        with self.lock:
+            self.lock_errors += 1
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def histogram(values):
+    """``[(upper bound or None for overflow, count)]`` over ``BUCKETS``."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for value in values:
+        counts[bisect.bisect_left(BUCKETS, value)] += 1
+    return list(zip(BUCKETS + [None], counts))
+
+
+class StepFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, number, transport, stats, targets, think_time, rng, prefix):
+        self.number = number
+        self.transport = transport
+        self.stats = stats
+        self.targets = targets
+        self.think_time = think_time
+        self.rng = rng
+        self.username = f"{prefix}{number}"
+        self.password = f"Sail-{uuid.uuid4().hex[:12]}!"
+        self.client = f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+        self.cookies = {}
+
+    def think(self):
+        if self.think_time > 0:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+
+    def _store_cookies(self, headers):
+        for name, value in headers:
+            if name.lower() != 'set-cookie':
+                continue
+            for key, morsel in SimpleCookie(value).items():
+                if morsel['max-age'] == '0' or not morsel.value:
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+
+    def call(self, step, method, path, data=None, expect=(200,)):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{key}={value}" for key, value in self.cookies.items())
+        body = b''
+        if method == 'POST':
+            body = urlencode(data or {}).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+
+        started = time.perf_counter()
+        try:
+            status, response_headers, content = self.transport.request(method, path, headers, body, self.client)
+        except Exception as exc:
+            self.stats.record(step, time.perf_counter() - started, f"exception:{type(exc).__name__}")
+            raise StepFailed(step) from exc
+        elapsed = time.perf_counter() - started
+        self._store_cookies(response_headers)
+
+        if status in expect:
+            outcome = 'ok'
+        elif status == 429:
+            outcome = 'throttled'
+        elif status == 409:
+            outcome = 'conflict'
+        else:
+            outcome = str(status)
+        self.stats.record(step, elapsed, outcome)
+        if outcome != 'ok':
+            raise StepFailed(step)
+        return content
+
+    def sign_up(self):
+        self.call('register_form', 'GET', '/accounts/register/')
+        self.call('register', 'POST', '/accounts/register/', {
+            'username': self.username,
+            'first_name': 'Load',
+            'last_name': f"Tester {self.number}",
+            'email': f"{self.username}@example.com",
+            'phone_number': f"09{self.number:09d}",
+            'address': 'Load test',
+            'password1': self.password,
+            'password2': self.password,
+        }, expect=(302,))
+        self.think()
+        self.call('logout', 'GET', '/accounts/logout/', expect=(302,))
+        self.call('login_form', 'GET', '/accounts/login/')
+        self.call('login', 'POST', '/accounts/login/',
+                  {'username': self.username, 'password': self.password}, expect=(302,))
+        self.call('home', 'GET', '/home/')
+
+    def book(self):
+        (from_port, to_port, day), reservable = self.rng.choice(self.targets)
+        self.think()
+        sailings = json.loads(self.call(
+            'search', 'GET', f"/ferry/api/schedules/search/?from={from_port}&to={to_port}&date={day}",
+        ))['sailings']
+        candidates = [s['schedule_id'] for s in sailings if s['schedule_id'] in reservable and s['seats_left'] > 0]
+        if not candidates:
+            self.stats.count('search', 'sold_out')
+            return
+        schedule_id = self.rng.choice(candidates)
+        self.think()
+        self.call('availability', 'GET', f"/ferry/api/schedules/{schedule_id}/availability/")
+        self.think()
+        reservation_id = json.loads(self.call(
+            'reserve', 'POST', f"/ferry/api/schedules/{schedule_id}/reserve/", expect=(201,),
+        ))['reservation_id']
+        self.think()
+        self.call('pay', 'POST', f"/ferry/api/reservations/{reservation_id}/pay/",
+                  {'payment_method': self.rng.choice(['CREDIT_CARD', 'DEBIT_CARD', 'MOBILE_PAYMENT'])})
+
+    def run(self, bookings, deadline):
+        try:
+            self.sign_up()
+        except StepFailed:
+            return
+        for _ in range(bookings):
+            if time.monotonic() >= deadline:
+                break
+            try:
+                self.book()
+            except StepFailed:
+                continue
+
+
+def booking_targets(now, days):
+    """``[((from_port, to_port, date), reservable schedule ids)]`` for upcoming sailings."""
+    targets = defaultdict(set)
+    for schedule_id, from_port, to_port, departure_time in (
+        Schedule.objects.filter(departure_time__gt=now, departure_time__lt=now + datetime.timedelta(days=days),
+                                reserve=True)
+        .values_list('schedule_id', 'route__departure_port_id', 'route__arrival_port_id', 'departure_time')
+    ):
+        targets[from_port, to_port, timezone.localtime(departure_time).date()].add(schedule_id)
+    return sorted(targets.items())
+
+
+def innodb_lock_counters():
+    """InnoDB row-lock wait count and total wait time (ms) on MySQL, else None."""
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+class LockTimer:
+    """Times ``FOR UPDATE`` statements and counts lock errors on every new connection."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        locking = 'FOR UPDATE' in sql
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except Exception as exc:
+            if any(marker in str(exc).lower() for marker in LOCK_ERRORS):
+                self.stats.record_lock_error()
+            raise
+        finally:
+            if locking:
+                self.stats.record_lock_wait(time.perf_counter() - started)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+
+
+class QueryCounter:
+    """Counts the queries of every new connection, like ``LockTimer``."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.queries += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+
+
+def run_load_test(transport, users=50, concurrency=20, bookings=3, think_time=0.2, duration=60.0,
+                  days=7, seed=0):
+    """Drive ``users`` virtual users on ``concurrency`` threads. Returns the report dict."""
+    now = timezone.now()
+    targets = booking_targets(now, days)
+    if not targets:
+        raise ValueError(f"No reservable sailings in the next {days} days.")
+    stats = Stats()
+    prefix = f"load-{uuid.uuid4().hex[:6]}-"
+    queue = list(range(users))
+    queue_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    before = innodb_lock_counters()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        try:
+            while time.monotonic() < deadline:
+                with queue_lock:
+                    if not queue:
+                        return
+                    number = queue.pop(0)
+                VirtualUser(number, transport, stats, targets, think_time, rng, prefix).run(bookings, deadline)
+        finally:
+            connection.close()
+
+    in_process = transport.name in ('wsgi', 'asgi')
+    started = time.monotonic()
+    with LockTimer(stats) if in_process else contextlib.nullcontext():
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.monotonic() - started
+    after = innodb_lock_counters()
+
+    return {
+        'transport': transport.name,
+        'elapsed': elapsed,
+        'stats': stats,
+        'innodb': None if before is None else {name: after[name] - before[name] for name in before},
+        'lock_waits_measured': in_process and connection.features.has_select_for_update,
+    }
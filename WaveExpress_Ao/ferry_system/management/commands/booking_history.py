@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ferry_system import audit
+from ferry_system.models import Payment, Reservation, Ticket
+from ferry_system.utils import parse_moment
+
+MODELS = {'ticket': Ticket, 'reservation': Reservation, 'payment': Payment}
+
+
+class Command(BaseCommand):
+    help = "Show the audit trail of a ticket, reservation or payment and the state rebuilt from it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity_type', choices=sorted(MODELS))
+        parser.add_argument('entity_id', type=int)
+        parser.add_argument('--until', help="Rebuild the state as of this date/datetime.")
+
+    def handle(self, *args, **options):
+        entity_type, entity_id = options['entity_type'], options['entity_id']
+        try:
+            until = parse_moment(options['until'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        events = audit.history(entity_type, entity_id)
+        if until is not None:
+            events = events.filter(occurred_at__lte=until)
+        for event in events:
+            self.stdout.write(
+                f"{event.occurred_at:%Y-%m-%d %H:%M:%S}  {event.field}: "
+                f"{event.old_value} -> {event.new_value}  ({event.source or 'unknown'})"
+            )
+
+        state = audit.replay(entity_type, entity_id, until=until)
+        self.stdout.write(f"Replayed state: {state}")
+        if until is None:
+            current = MODELS[entity_type].objects.filter(pk=entity_id).first()
+            if current is None:
+                self.stdout.write(self.style.WARNING("The record no longer exists."))
+                return
+            stored = {field: str(value) for field, value in audit.snapshot(current).items()}
+            drift = {field: (value, stored.get(field)) for field, value in state.items() if stored.get(field) != value}
+            if drift:
+                self.stdout.write(self.style.WARNING(f"Stored state differs from the log: {drift}"))
+            else:
+                self.stdout.write(self.style.SUCCESS("Stored state matches the log."))
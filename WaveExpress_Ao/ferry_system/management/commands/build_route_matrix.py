@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ferry_system.route_matrix import rebuild_route_matrix
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the all-pairs port distance and duration matrix. Run it from cron so "
+            "typical durations follow the schedule history.")
+
+    def handle(self, *args, **options):
+        try:
+            matrix = rebuild_route_matrix()
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        pairs = sum(1 for value in matrix.distances if value != float('inf'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Built matrix for {len(matrix.port_ids)} port(s), {pairs} reachable pair(s)."
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ferry_system.disruptions import cancel_sailings, disrupted_schedules
+from ferry_system.utils import parse_moment
+
+
+class Command(BaseCommand):
+    help = "Cancel disrupted sailings and refund every booking on them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, action='append', dest='schedules',
+                            help="Schedule id to cancel (repeatable).")
+        parser.add_argument('--route', type=int, help="Cancel sailings of this route id.")
+        parser.add_argument('--from', dest='start', help="Departures from this date/datetime.")
+        parser.add_argument('--to', dest='end', help="Departures up to this date/datetime (inclusive for dates).")
+        parser.add_argument('--rebook', action='store_true',
+                            help="Move passengers to later sailings between the same ports before cancelling.")
+
+    def handle(self, *args, **options):
+        try:
+            schedules = disrupted_schedules(
+                schedule_ids=options['schedules'],
+                route=options['route'],
+                start=parse_moment(options['start']),
+                end=parse_moment(options['end'], end_of_day=True),
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        result = cancel_sailings(schedules, rebook=options['rebook'])
+        rebooked = result['rebooking']
+        if rebooked is not None:
+            self.stdout.write(
+                f"Rebooked {rebooked['rebooked']} passenger(s); {rebooked['unplaced']} could not be placed."
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Cancelled {result['schedules']} sailing(s): "
+            f"{result['tickets_cancelled']} tickets, "
+            f"{result['reservations_cancelled']} reservations, "
+            f"{result['waitlist_cancelled']} waitlist entries, "
+            f"{result['payments_refunded']} payments refunded ({result['refund_total']}), "
+            f"{result['payments_voided']} pending payments voided."
+        ))
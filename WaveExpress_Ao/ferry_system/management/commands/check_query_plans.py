@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ferry_system.query_checks import run_checks
+from ferry_system.synthetic import seed_fleet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Run the query checks of ferry_system.tests.test_query_plans against seeded data in the "
+            "configured database, printing SQL and plans; fails when one exceeds its query budget or "
+            "stops using its expected index. Seed data is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('checks', nargs='*', help="Only run these checks.")
+        parser.add_argument('--days', type=int, default=30, help="Days of sailings to seed.")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every EXPLAIN output.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixture = seed_fleet(days=options['days'])
+                results = run_checks(fixture, names=options['checks'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        failures = 0
+        for result in results:
+            if result['passed']:
+                self.stdout.write(self.style.SUCCESS(f"ok    {result['name']}"))
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL  {result['name']}"))
+                self.stdout.write(result['diff'])
+                for number, sql in enumerate(result['queries'], 1):
+                    self.stdout.write(f"  [{number}] {sql}")
+            if result['plan'] and (options['verbose_plans'] or not result['passed']):
+                self.stdout.write(f"  EXPLAIN:\n    " + result['plan'].replace('\n', '\n    '))
+
+        if failures:
+            raise CommandError(f"{failures} query check(s) failed.")
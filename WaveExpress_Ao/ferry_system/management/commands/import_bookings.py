@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ferry_system.imports import CHUNK_SIZE, import_bookings
+
+
+class Command(BaseCommand):
+    help = "Import partner agency bookings (passengers and tickets) from a CSV or JSON lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format (default: from the file extension, else csv).")
+        parser.add_argument('--rejects', help="Write rejected rows to this CSV file.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        reject_stream = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+
+        try:
+            stats = import_bookings(stream, format=format, reject_stream=reject_stream,
+                                    chunk_size=options['chunk_size'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if reject_stream is not None:
+                reject_stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {stats['rows']} row(s): imported {stats['imported']} ticket(s), "
+            f"created {stats['passengers_created']} passenger(s), rejected {stats['rejected']}."
+        ))
@@ -0,0 +1,105 @@
+import itertools
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from ferry_system import loadtest, throttling, views
+from ferry_system.models import Schedule
+
+
+class Command(BaseCommand):
+    help = ("Hammer the seat availability API of one sailing from many simulated clients through the "
+            "WSGI or ASGI application (or a running server) and report request outcomes and database "
+            "queries per second.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, help="Sailing to query (default: the next departure).")
+        parser.add_argument('--transport', choices=['wsgi', 'asgi', 'http'], default='wsgi',
+                            help="Call the application in process, or send HTTP to --url.")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server for --transport http.")
+        parser.add_argument('--host', default='localhost', help="Host header for in-process transports.")
+        parser.add_argument('--clients', type=int, default=1000, help="Distinct simulated clients.")
+        parser.add_argument('--threads', type=int, default=50, help="Concurrent request threads.")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds to run.")
+        parser.add_argument('--baseline', action='store_true',
+                            help="Compute every request directly in process, without the request stack, "
+                                 "rate limiting or coalescing.")
+
+    def handle(self, *args, **options):
+        schedule_id = options['schedule'] or (
+            Schedule.objects.filter(departure_time__gte=timezone.now())
+            .order_by('departure_time').values_list('schedule_id', flat=True).first()
+        )
+        if schedule_id is None:
+            raise CommandError("No upcoming sailing to query; pass --schedule.")
+        if options['transport'] == 'http':
+            if options['baseline']:
+                raise CommandError("--baseline only applies to the in-process transports.")
+            transport = loadtest.HTTPTransport(options['url'])
+        elif options['transport'] == 'asgi':
+            transport = loadtest.ASGITransport(options['host'])
+        else:
+            transport = loadtest.WSGITransport(options['host'])
+        in_process = transport.name in ('wsgi', 'asgi')
+
+        path = f"/ferry/api/schedules/{schedule_id}/availability/"
+        clients = [f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}" for n in range(options['clients'])]
+        next_client = itertools.cycle(clients).__next__
+        outcomes = Counter()
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker():
+            local = Counter()
+            try:
+                while time.monotonic() < deadline:
+                    if options['baseline']:
+                        views._availability(schedule_id)
+                        close_old_connections()
+                        local[200] += 1
+                        continue
+                    with lock:
+                        client = next_client()
+                    try:
+                        status, _, _ = transport.request('GET', path, {}, client=client)
+                    except Exception as exc:
+                        local[f"exception:{type(exc).__name__}"] += 1
+                    else:
+                        local[status] += 1
+            finally:
+                connection.close()
+                with lock:
+                    outcomes.update(local)
+
+        throttling.reset_counters()
+        started = time.monotonic()
+        # Each request opens its own connections (CONN_MAX_AGE), so count on every new one
+        with loadtest.QueryCounter() as counter:
+            threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.monotonic() - started
+
+        total = sum(outcomes.values())
+        counters = throttling.counters()
+        mode = 'baseline' if options['baseline'] else transport.name
+        self.stdout.write(f"{mode}: schedule {schedule_id}, {options['clients']} clients on "
+                          f"{options['threads']} threads, {elapsed:.1f}s")
+        self.stdout.write(f"  requests        {total} ({total / elapsed:.0f}/s)")
+        self.stdout.write(f"  ok              {outcomes[200]}")
+        self.stdout.write(f"  rate limited    {outcomes[429]}")
+        others = ', '.join(f"{outcome} {count}" for outcome, count in outcomes.items() if outcome not in (200, 429))
+        if others:
+            self.stdout.write(f"  other           {others}")
+        if in_process:
+            self.stdout.write(f"  coalesced       {counters.get('availability.coalesced', 0)}")
+            self.stdout.write(f"  computed        {counters.get('availability.computed', 0)}")
+            self.stdout.write(f"  db queries      {counter.queries} ({counter.queries / elapsed:.0f}/s)")
+        else:
+            self.stdout.write("  Coalescing and queries are counted by the server; see /ferry/api/throttling/stats/.")
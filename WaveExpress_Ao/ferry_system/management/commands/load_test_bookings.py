@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from ferry_system import loadtest
+from ferry_system.synthetic import seed_fleet
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+OK_OUTCOMES = {'ok', 'throttled', 'conflict', 'sold_out'}
+
+
+class Command(BaseCommand):
+    help = ("Simulate a ticket-sale rush: virtual users register, log in, search, reserve and pay through "
+            "the WSGI or ASGI application (or a running server) and report throughput, errors, lock waits "
+            "and latencies. Writes users and tickets, so run it against a local database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=['wsgi', 'asgi', 'http'], default='wsgi',
+                            help="Call the application in process, or send HTTP to --url.")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server for --transport http.")
+        parser.add_argument('--host', default='localhost', help="Host header for in-process transports.")
+        parser.add_argument('--users', type=int, default=50, help="Virtual users to run in total.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Virtual users active at once.")
+        parser.add_argument('--bookings', type=int, default=3, help="Bookings each user attempts.")
+        parser.add_argument('--think-time', type=float, default=0.2,
+                            help="Mean seconds between a user's steps (exponential; 0 for none).")
+        parser.add_argument('--duration', type=float, default=60.0, help="Stop starting new steps after this.")
+        parser.add_argument('--days', type=int, default=7, help="Book sailings departing within this many days.")
+        parser.add_argument('--seed-fleet', action='store_true',
+                            help="Create a synthetic fleet with a week of sailings first.")
+        parser.add_argument('--fast-hashing', action='store_true',
+                            help="Hash passwords with MD5 in process, to measure booking rather than PBKDF2.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the virtual users.")
+
+    def handle(self, *args, **options):
+        if options['seed_fleet']:
+            fleet = seed_fleet(ports=4, ferries=4, days=options['days'], tickets_per_sailing=20)
+            self.stdout.write(f"Seeded {len(fleet['schedule_ids'])} sailings.")
+
+        if options['transport'] == 'http':
+            if options['fast_hashing']:
+                raise CommandError("--fast-hashing only applies to the in-process transports.")
+            transport = loadtest.HTTPTransport(options['url'])
+        elif options['transport'] == 'asgi':
+            transport = loadtest.ASGITransport(options['host'])
+        else:
+            transport = loadtest.WSGITransport(options['host'])
+
+        hashers = override_settings(PASSWORD_HASHERS=FAST_HASHERS) if options['fast_hashing'] else None
+        if hashers:
+            hashers.enable()
+        try:
+            report = loadtest.run_load_test(
+                transport, users=options['users'], concurrency=options['concurrency'],
+                bookings=options['bookings'], think_time=options['think_time'],
+                duration=options['duration'], days=options['days'], seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(f"{exc} Pass --seed-fleet to create some.")
+        finally:
+            if hashers:
+                hashers.disable()
+        self.report(report, options)
+
+    def report(self, report, options):
+        stats, elapsed = report['stats'], report['elapsed']
+        requests = sum(len(values) for values in stats.latencies.values())
+        errors = sum(
+            count for outcomes in stats.outcomes.values()
+            for outcome, count in outcomes.items() if outcome not in OK_OUTCOMES
+        )
+        self.stdout.write(
+            f"{report['transport']}: {options['users']} users, {options['concurrency']} concurrent, "
+            f"think {options['think_time']}s, {elapsed:.1f}s"
+        )
+        self.stdout.write(f"  requests   {requests} ({requests / elapsed:.1f}/s)")
+        self.stdout.write(f"  bookings   {stats.bookings} ({stats.bookings / elapsed:.1f}/s)")
+        self.stdout.write(f"  errors     {errors} ({errors / max(requests, 1):.1%})")
+
+        self.stdout.write(f"\n  {'step':<14}{'count':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}  outcomes")
+        for step in loadtest.STEPS:
+            values = sorted(stats.latencies.get(step, []))
+            if not values and step not in stats.outcomes:
+                continue
+            outcomes = ', '.join(f"{name} {count}" for name, count in stats.outcomes[step].most_common())
+            cells = ''.join(
+                f"{loadtest.percentile(values, fraction) * 1000:>9.1f}" for fraction in (0.5, 0.9, 0.99)
+            ) + f"{(values[-1] if values else 0) * 1000:>9.1f}"
+            self.stdout.write(f"  {step:<14}{len(values):>7}{cells}  {outcomes}")
+
+        all_latencies = [value for values in stats.latencies.values() for value in values]
+        if all_latencies:
+            self.stdout.write("\n  Latency histogram, all requests:")
+            buckets = loadtest.histogram(all_latencies)
+            peak = max(count for _, count in buckets)
+            for bound, count in buckets:
+                if not count:
+                    continue
+                label = f"<= {bound * 1000:.0f}ms" if bound is not None else f"> {loadtest.BUCKETS[-1] * 1000:.0f}ms"
+                self.stdout.write(f"  {label:>12} {count:>7}  {'#' * max(1, round(40 * count / peak))}")
+
+        if report['lock_waits_measured']:
+            waits = sorted(stats.lock_waits)
+            self.stdout.write(
+                f"\n  SELECT ... FOR UPDATE: {len(waits)} statements, total {sum(waits):.2f}s, "
+                f"p50 {loadtest.percentile(waits, 0.5) * 1000:.1f}ms, "
+                f"p99 {loadtest.percentile(waits, 0.99) * 1000:.1f}ms, "
+                f"max {(waits[-1] if waits else 0) * 1000:.1f}ms"
+            )
+        else:
+            self.stdout.write("\n  Row lock waits are only timed in process, on backends with SELECT ... FOR UPDATE.")
+        self.stdout.write(f"  lock errors: {stats.lock_errors}")
+        if report['innodb'] is not None:
+            self.stdout.write(
+                f"  InnoDB row lock waits {report['innodb']['Innodb_row_lock_waits']}, "
+                f"row lock time {report['innodb']['Innodb_row_lock_time']}ms"
+            )
@@ -0,0 +1,113 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BATCH_SETTINGS = 'WaveExpress_Ao.settings_batch'
+
+# Python snippets run in a fresh interpreter; each one is a kind of cold start
+BOOT_TARGETS = {
+    'setup': "import django; django.setup()",
+    'wsgi': ("from WaveExpress_Ao.wsgi import application; "
+             "from django.urls import get_resolver; get_resolver().url_patterns"),
+    'asgi': ("from WaveExpress_Ao.asgi import application; "
+             "from django.urls import get_resolver; get_resolver().url_patterns"),
+}
+DEFAULT_COMMANDS = ['export_bookings', 'run_workers', 'refresh_upcoming_departures']
+
+
+class Command(BaseCommand):
+    help = ("Benchmark cold start of manage.py commands and WSGI/ASGI worker boot under the full "
+            "and the batch settings, or break down the import time of one start with --imports.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Cold starts per target (median is reported).")
+        parser.add_argument('--command', action='append', dest='commands',
+                            help=f"manage.py command to time (repeatable; default: {', '.join(DEFAULT_COMMANDS)}).")
+        parser.add_argument('--settings-module', action='append', dest='settings_modules',
+                            help=f"Settings to compare (repeatable; default: the current ones and {BATCH_SETTINGS}).")
+        parser.add_argument('--imports', metavar='TARGET',
+                            help="Print an import-time breakdown of one target: setup, wsgi, asgi or a command name.")
+        parser.add_argument('--top', type=int, default=25, help="Modules to list with --imports.")
+
+    def _argv(self, target):
+        if target in BOOT_TARGETS:
+            return [sys.executable, '-c', BOOT_TARGETS[target]]
+        # --help loads settings, sets up the apps and imports the command without running it
+        return [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), target, '--help']
+
+    def _run(self, target, settings_module, importtime=False):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        argv = self._argv(target)
+        if importtime:
+            argv.insert(1, '-Ximporttime')
+        started = time.perf_counter()
+        result = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(f"{target} failed under {settings_module}: {result.stderr.strip().splitlines()[-1]}")
+        return elapsed, result.stderr
+
+    def benchmark(self, options):
+        settings_modules = options['settings_modules'] or [os.environ['DJANGO_SETTINGS_MODULE'], BATCH_SETTINGS]
+        targets = ['setup', 'wsgi', 'asgi'] + (options['commands'] or DEFAULT_COMMANDS)
+        baseline = [sys.executable, '-c', 'pass']
+        interpreter = statistics.median(
+            self._time(lambda: subprocess.run(baseline, check=True)) for _ in range(options['runs'])
+        )
+        self.stdout.write(f"Median of {options['runs']} cold starts in ms (bare interpreter: {interpreter * 1000:.0f}ms)")
+        width = max(len(target) for target in targets) + 2
+        errors = []
+        self.stdout.write(''.ljust(width) + ''.join(module.rsplit('.', 1)[-1].rjust(22) for module in settings_modules))
+        for target in targets:
+            cells = []
+            for settings_module in settings_modules:
+                try:
+                    times = [self._run(target, settings_module)[0] for _ in range(options['runs'])]
+                except CommandError as exc:
+                    # The batch settings cannot serve requests (no admin for the URLconf)
+                    errors.append(str(exc))
+                    cells.append('n/a'.rjust(22))
+                    continue
+                cells.append(f"{statistics.median(times) * 1000:.0f}".rjust(22))
+            self.stdout.write(target.ljust(width) + ''.join(cells))
+        for error in errors:
+            self.stdout.write(f"  n/a: {error}")
+
+    def _time(self, func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
+
+    def import_breakdown(self, options):
+        settings_module = (options['settings_modules'] or [os.environ['DJANGO_SETTINGS_MODULE']])[0]
+        _, stderr = self._run(options['imports'], settings_module, importtime=True)
+        modules, packages = [], defaultdict(int)
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            modules.append((int(cumulative_us), int(self_us), name))
+            packages[name.split('.')[0]] += int(self_us)
+
+        total = sum(packages.values())
+        self.stdout.write(f"Imports of {options['imports']} under {settings_module}: {total / 1000:.0f}ms, "
+                          f"{len(modules)} modules")
+        self.stdout.write("\nSelf time by top-level package:")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {self_us / 1000:8.1f}ms  {self_us / total:6.1%}  {package}")
+        self.stdout.write("\nSlowest imports (cumulative, including what they import):")
+        for cumulative_us, self_us, name in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}ms  {self_us / 1000:7.1f}ms self  {name}")
+
+    def handle(self, *args, **options):
+        if options['imports']:
+            self.import_breakdown(options)
+        else:
+            self.benchmark(options)
@@ -0,0 +1,17 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from ferry_system.departures import HORIZON, refresh_upcoming_departures
+
+
+class Command(BaseCommand):
+    help = "Rebuild the upcoming-departures summary shown on the home page. Run it from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=HORIZON.days,
+                            help="How many days ahead to materialize.")
+
+    def handle(self, *args, **options):
+        count = refresh_upcoming_departures(horizon=datetime.timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Materialized {count} upcoming departure(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ferry_system.capacity import rollup_no_shows
+
+
+class Command(BaseCommand):
+    help = ("Add the tickets and no-shows of newly departed sailings to the per route, weekday and hour "
+            "rollups and re-cache the sellable capacity of upcoming sailings. Run it hourly from cron.")
+
+    def handle(self, *args, **options):
+        stats = rollup_no_shows()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {stats['windows']} window(s) into {stats['slots']} slot(s); "
+            f"cached the sellable capacity of {stats['warmed']} upcoming sailing(s)."
+        ))
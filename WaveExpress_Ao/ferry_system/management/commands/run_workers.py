@@ -0,0 +1,76 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from ferry_system.jobs import (
+    HEARTBEAT_INTERVAL, claim_jobs, heartbeat, purge_finished_jobs, requeue_stale_jobs, run_job, worker_name,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (confirmation emails, summary refreshes, ...) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Jobs run at the same time.")
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help="Run jobs on threads (default) or separate processes.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due.")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            # Children start from a fresh interpreter (so they never share the
+            # parent's database connections) and set Django up before any job
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                concurrency, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(concurrency, thread_name_prefix='job')
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        name = worker_name()
+        requeue_stale_jobs()
+        last_housekeeping = last_heartbeat = timezone.now()
+        running = set()
+        done = 0
+        self.stdout.write(f"Worker {name} running up to {concurrency} job(s) on a {options['pool']} pool.")
+
+        try:
+            while not stopping:
+                free = concurrency - len(running)
+                job_ids = claim_jobs(free, worker=name) if free else []
+                for job_id in job_ids:
+                    running.add(pool.submit(run_job, job_id))
+
+                if running:
+                    finished, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    done += len(finished)
+                    for future in finished:
+                        future.result()
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+
+                if running and timezone.now() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    heartbeat(name)
+                    last_heartbeat = timezone.now()
+                if (timezone.now() - last_housekeeping).total_seconds() > 600:
+                    requeue_stale_jobs()
+                    purge_finished_jobs()
+                    last_housekeeping = timezone.now()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+        self.stdout.write(f"Worker {name} stopped after {done} job(s).")
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from . import audit
+from .profiling import ProfileWriter, StackSampler
+from .routers import reset_primary_sticky, set_primary_sticky
+
+STICKY_COOKIE = 'primary_until'
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Keep reads on the primary database for unsafe requests and, via a short
+    lived cookie, for the same client's requests right after them, so
+    replica lag never hides a booking the user just made.
+    """
+
+    def __init__(self, get_response):
+        from django.conf import settings
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+    def __call__(self, request):
+        now = timezone.now().timestamp()
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        try:
+            recently_wrote = float(request.COOKIES.get(STICKY_COOKIE, 0)) > now
+        except ValueError:
+            recently_wrote = False
+
+        token = set_primary_sticky(unsafe or recently_wrote)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_primary_sticky(token)
+
+        if unsafe:
+            response.set_cookie(
+                STICKY_COOKIE, str(now + self.sticky_seconds),
+                max_age=self.sticky_seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class AuditBufferMiddleware:
+    """
+    Write the booking audit events of a request with one insert when it
+    finishes, however many autocommit saves or transactions it ran.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit.buffered():
+            return self.get_response(request)
+
+
+class SlowRequestProfilerMiddleware:
+    """
+    Sample the stacks of every request and write a flamegraph-compatible
+    profile to ``PROFILE_DIR`` for requests slower than
+    ``PROFILE_SLOW_REQUEST_MS``, or for staff requests carrying the
+    ``X-Profile`` header. Disabled while ``PROFILE_DIR`` is unset.
+    """
+
+    def __init__(self, get_response):
+        from django.conf import settings
+        directory = getattr(settings, 'PROFILE_DIR', None)
+        if not directory:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'PROFILE_SLOW_REQUEST_MS', 500) / 1000
+        self.sampler = StackSampler(interval=getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000)
+        self.writer = ProfileWriter(directory, per_minute=getattr(settings, 'PROFILE_MAX_PER_MINUTE', 10))
+
+    def __call__(self, request):
+        ident = threading.get_ident()
+        self.sampler.start(ident)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            stacks = self.sampler.stop(ident)
+            reason = None
+            if elapsed >= self.threshold:
+                reason = 'Slow'
+            elif request.headers.get('X-Profile') and getattr(getattr(request, 'user', None), 'is_staff', False):
+                reason = 'Staff-profiled'
+            if reason:
+                self.writer.write(stacks, request.method, request.path, elapsed, reason)
@@ -50,10 +50,18 @@ class Schedule(models.Model):
     arrival_time = models.DateTimeField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     reserve = models.BooleanField(default=False)  # Added as requested
+    cancelled = models.BooleanField(default=False)  # Set by ferry_system.disruptions.cancel_sailings
 
     def __str__(self):
         return f"{self.route.route_name} - {self.departure_time.strftime('%Y-%m-%d %H:%M')}"
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ferry', 'departure_time'], name='schedule_ferry_departure_idx'),
+            models.Index(fields=['route', 'departure_time'], name='schedule_route_departure_idx'),
+            models.Index(fields=['departure_time'], name='schedule_departure_idx'),
+        ]
+
     def clean(self):
         if self.departure_time >= self.arrival_time:
             raise ValidationError("Departure time must be before arrival time.")
@@ -61,6 +69,7 @@ class Schedule(models.Model):
         # Check for scheduling conflicts with the same ferry
         conflicts = Schedule.objects.filter(
             ferry=self.ferry,
+            cancelled=False,
             departure_time__lt=self.arrival_time,
             arrival_time__gt=self.departure_time
         ).exclude(pk=self.pk)
@@ -75,7 +84,7 @@ class Passenger(models.Model):
     passenger_name = models.CharField(max_length=100)
     contact_number = models.CharField(max_length=20)
     address = models.TextField()
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
 
     def __str__(self):
         return f"{self.passenger_name} ({self.email})"
@@ -101,10 +110,17 @@ class Ticket(models.Model):
     seat_number = models.CharField(max_length=10, blank=True, null=True)
     ticket_status = models.CharField(max_length=20, choices=TICKET_STATUS_CHOICES, default='ACTIVE')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='UNPAID')
+    # Marks the tickets written by one chunk of ferry_system.imports
+    import_batch = models.CharField(max_length=32, null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Ticket #{self.ticket_id} - {self.passenger.passenger_name}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['schedule', 'ticket_status'], name='ticket_schedule_status_idx'),
+        ]
+
 
 class Reservation(models.Model):
     RESERVATION_STATUS_CHOICES = [
@@ -122,6 +138,12 @@ class Reservation(models.Model):
     def __str__(self):
         return f"Reservation #{self.reservation_id} - {self.passenger.passenger_name}"
 
+    class Meta:
+        indexes = [
+            # Expiry sweep of unpaid reservations (ferry_system.booking)
+            models.Index(fields=['status', 'date_of_reservation'], name='reservation_pending_idx'),
+        ]
+
     def clean(self):
         if not self.schedule.reserve:
             raise ValidationError("This schedule does not allow reservations.")
@@ -151,6 +173,8 @@ class Payment(models.Model):
     transaction_reference = models.CharField(max_length=100, blank=True, null=True)
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, null=True, blank=True)
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, null=True, blank=True)
+    # Set on REFUNDED rows: the COMPLETED payment this one pays back
+    refund_of = models.OneToOneField('self', on_delete=models.CASCADE, null=True, blank=True, related_name='refund')
 
     def __str__(self):
         if self.ticket:
@@ -202,3 +226,220 @@ class FerryAssignment(models.Model):
         
         if conflicts.exists():
             raise ValidationError("This ferry is already assigned to another schedule during this time period.")
+
+
+class UpcomingDeparture(models.Model):
+    """
+    Denormalized summary of a future sailing for the home page.
+
+    Rebuilt by ``manage.py refresh_upcoming_departures`` and refreshed for a
+    single sailing by a background job whenever its Schedule is saved or its
+    tickets change; ``seats_left`` is as of ``refreshed_at``.
+    """
+    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE, primary_key=True, related_name='upcoming')
+    departure_time = models.DateTimeField(db_index=True)
+    arrival_time = models.DateTimeField()
+    route_name = models.CharField(max_length=100)
+    departure_port_name = models.CharField(max_length=100)
+    arrival_port_name = models.CharField(max_length=100)
+    ferry_name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    reserve = models.BooleanField(default=False)
+    seats_left = models.IntegerField()
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.route_name} - {self.departure_time.strftime('%Y-%m-%d %H:%M')}"
+
+
+class TicketRevocation(models.Model):
+    """
+    A ticket whose tokens for a sailing no longer verify (see
+    ferry_system.tokens): it was cancelled or deleted, or moved off that
+    sailing. Plain ids, so the row outlives a deleted ticket or schedule.
+    """
+    ticket_id = models.BigIntegerField()
+    schedule_id = models.BigIntegerField()
+    revoked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Ticket #{self.ticket_id} revoked on schedule #{self.schedule_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['schedule_id', 'ticket_id'], name='ticketrevocation_unique'),
+        ]
+
+
+class BoardingScan(models.Model):
+    """
+    An accepted boarding scan (see ferry_system.checkin). The primary key on
+    the ticket rejects a second scan from any gate or web process; the scan
+    stays unflushed until its ticket has been written as USED.
+    """
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='boarding_scan')
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='boarding_scans')
+    scanned_at = models.DateTimeField(default=timezone.now)
+    flushed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Scan of ticket #{self.ticket_id} at {self.scanned_at:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['schedule', 'flushed_at'], name='boardingscan_unflushed_idx'),
+        ]
+
+
+class BookingEvent(models.Model):
+    """
+    Append-only log of booking state changes, written by ferry_system.audit.
+    Rows are never updated; the state of a booking at any point can be
+    rebuilt by replaying its events in order.
+    """
+    ENTITY_CHOICES = [
+        ('ticket', 'Ticket'),
+        ('reservation', 'Reservation'),
+        ('payment', 'Payment')
+    ]
+
+    event_id = models.BigAutoField(primary_key=True)
+    entity_type = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    entity_id = models.IntegerField()
+    field = models.CharField(max_length=30)
+    old_value = models.CharField(max_length=50, blank=True, null=True)
+    new_value = models.CharField(max_length=50, blank=True, null=True)
+    source = models.CharField(max_length=50, blank=True)
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.entity_type} #{self.entity_id}: {self.field} {self.old_value} -> {self.new_value}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity_type', 'entity_id', 'event_id'], name='bookingevent_entity_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    A deferred side effect run by ``manage.py run_workers``.
+
+    ``dedupe_key`` is unique while a job is queued, so enqueueing the same
+    work twice keeps a single job; it is cleared when a worker claims it.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Job #{self.job_id} {self.name} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+
+class WaitlistEntry(models.Model):
+    """
+    A passenger waiting for a seat on a sold-out sailing (see ferry_system.waitlist).
+
+    The queue is ordered by ``(priority, position)``; ``position`` is
+    assigned per schedule and tier when the passenger joins. A promoted
+    entry is HELD until ``hold_expires_at`` and then converted to a ticket
+    or EXPIRED. A passenger has at most one WAITING or HELD entry per sailing.
+    """
+    PRIORITY_CHOICES = [
+        (0, 'Assisted travel'),
+        (1, 'Priority'),
+        (2, 'Standard')
+    ]
+
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting'),
+        ('HELD', 'Held'),
+        ('CONVERTED', 'Converted'),
+        ('EXPIRED', 'Expired'),
+        ('CANCELLED', 'Cancelled')
+    ]
+
+    entry_id = models.BigAutoField(primary_key=True)
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='waitlist')
+    passenger = models.ForeignKey(Passenger, on_delete=models.CASCADE)
+    priority = models.SmallIntegerField(choices=PRIORITY_CHOICES, default=2)
+    position = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='WAITING')
+    joined_at = models.DateTimeField(default=timezone.now)
+    held_at = models.DateTimeField(blank=True, null=True)
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+    ticket = models.OneToOneField(Ticket, on_delete=models.SET_NULL, blank=True, null=True)
+
+    def __str__(self):
+        return f"Waitlist #{self.entry_id} - {self.passenger.passenger_name} ({self.status})"
+
+    class Meta:
+        verbose_name_plural = "Waitlist entries"
+        indexes = [
+            models.Index(fields=['schedule', 'status', 'priority', 'position'], name='waitlist_queue_idx'),
+            models.Index(fields=['status', 'hold_expires_at'], name='waitlist_hold_expiry_idx'),
+        ]
+        constraints = [
+            # Partial unique index; MySQL lacks those, where join_waitlist's
+            # schedule row lock is the only guard
+            models.UniqueConstraint(
+                fields=['schedule', 'passenger'], condition=models.Q(status__in=['WAITING', 'HELD']),
+                name='waitlist_active_entry_unique',
+            ),
+        ]
+
+
+class NoShowRollup(models.Model):
+    """
+    Ticket and no-show counts of departed sailings per route, weekday and
+    departure hour (local time), maintained incrementally by
+    ferry_system.capacity. A no-show is a ticket still ACTIVE after its
+    sailing departed; boarded tickets are USED.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='no_show_rollups')
+    weekday = models.SmallIntegerField()  # 0 = Monday
+    hour = models.SmallIntegerField()
+    sailings = models.IntegerField(default=0)
+    tickets = models.IntegerField(default=0)
+    no_shows = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.route.route_name} weekday {self.weekday} {self.hour:02d}:00 ({self.no_shows}/{self.tickets})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['route', 'weekday', 'hour'], name='noshowrollup_slot_unique'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """How far an incremental rollup has progressed, e.g. the last departure time it counted."""
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
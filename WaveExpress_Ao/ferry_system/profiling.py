@@ -0,0 +1,151 @@
+"""
+Sampling profiles of slow requests.
+
+One background thread samples the Python stack of every thread that is
+serving a request (``sys._current_frames()`` every ``interval`` seconds) and
+counts the distinct stacks per request. Nothing is traced, so a request pays
+for two dictionary operations plus its share of the samples; the thread
+sleeps while no request is in flight. When a request turns out to be slow,
+its counted stacks are written in the folded format that ``flamegraph.pl``,
+speedscope and inferno read (``frame;frame;frame count`` per line, root
+first); otherwise they are dropped.
+
+Each sample is also put in one bucket by its innermost Django frame
+(database driver, ORM, template rendering, or other Python code), which is
+logged with the file name as a first breakdown.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Innermost matching frame decides the bucket of a sample
+CATEGORIES = [
+    ('django.db.backends.', 'db'),
+    ('django.db.models.', 'orm'),
+    ('django.template.', 'templates'),
+]
+
+
+def categorize(stacks):
+    """``{category: samples}`` of folded stacks, with uncategorized samples under ``other``."""
+    totals = Counter()
+    for stack, count in stacks.items():
+        category = None
+        for frame in reversed(stack.split(';')):
+            category = next((name for prefix, name in CATEGORIES if frame.startswith(prefix)), None)
+            if category:
+                break
+        totals[category or 'other'] += count
+    return totals
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from a daemon thread."""
+
+    def __init__(self, interval=0.005, max_depth=128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._stacks[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, ident):
+        """Stop sampling ``ident``; returns its ``Counter`` of folded stacks."""
+        with self._lock:
+            return self._stacks.pop(ident, Counter())
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(code.co_filename)[0]
+            for path in sorted(sys.path, key=len, reverse=True):
+                if path and module.startswith(path + os.sep):
+                    module = module[len(path) + 1:].replace(os.sep, '.')
+                    break
+            label = self._labels[code] = f"{module}.{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':')
+        return label
+
+    def _fold(self, frame):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idents = list(self._stacks)
+            if not idents:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            samples = [(ident, self._fold(frames[ident])) for ident in idents if ident in frames]
+            del frames
+            with self._lock:
+                for ident, stack in samples:
+                    stacks = self._stacks.get(ident)
+                    if stacks is not None:
+                        stacks[stack] += 1
+            time.sleep(self.interval)
+
+
+class ProfileWriter:
+    """Writes folded stacks to ``directory``, at most ``per_minute`` files a minute."""
+
+    def __init__(self, directory, per_minute=10):
+        self.directory = directory
+        self.per_minute = per_minute
+        self._window = (None, 0)
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        minute = int(time.monotonic() // 60)
+        with self._lock:
+            current, written = self._window
+            if current != minute:
+                current, written = minute, 0
+            if written >= self.per_minute:
+                return False
+            self._window = (current, written + 1)
+            return True
+
+    def write(self, stacks, method, path, elapsed, reason):
+        """Write a profile and log its breakdown. Returns the file path, or None if skipped."""
+        if not stacks or not self._admit():
+            return None
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', f"{method} {path}").strip('-')[:80]
+        name = f"{timezone.now():%Y%m%dT%H%M%S.%f}-{slug}-{elapsed * 1000:.0f}ms.folded"
+        os.makedirs(self.directory, exist_ok=True)
+        file_path = os.path.join(self.directory, name)
+        with open(file_path, 'w') as stream:
+            for stack, count in stacks.most_common():
+                stream.write(f"{stack} {count}\n")
+
+        total = sum(stacks.values())
+        breakdown = ', '.join(
+            f"{category} {count / total:.0%}" for category, count in categorize(stacks).most_common()
+        )
+        logger.warning("%s request %s %s took %.0fms (%s samples: %s), profile written to %s",
+                       reason, method, path, elapsed * 1000, total, breakdown, file_path)
+        return file_path
@@ -0,0 +1,89 @@
+"""
+Canonical read querysets for the ferry system.
+
+Views, APIs and the query-plan checks (``manage.py check_query_plans``) all
+build these querysets from here, so the shape that is checked against its
+query budget and index expectations is the one that actually runs.
+"""
+
+import datetime
+
+from django.db.models import CharField, F, Value
+from django.utils import timezone
+
+from .models import Passenger, Reservation, Schedule, Ticket, UpcomingDeparture
+from .utilization import tickets_sold_subquery
+
+
+def search_schedules(departure_port, arrival_port, day):
+    """Sailings between two ports departing on ``day`` with their route and ferry."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return (
+        Schedule.objects.filter(
+            departure_time__gte=start,
+            departure_time__lt=start + datetime.timedelta(days=1),
+            route__departure_port=departure_port,
+            route__arrival_port=arrival_port,
+            cancelled=False,
+        )
+        .select_related('route__departure_port', 'route__arrival_port', 'ferry')
+        .order_by('departure_time')
+    )
+
+
+def seat_availability(schedule_ids):
+    """
+    ``(schedule_id, capacity, tickets_sold, seats_left)`` rows for the given
+    sailings; cancelled sailings have no row, as nothing can be sold on them.
+    """
+    return (
+        Schedule.objects.filter(schedule_id__in=schedule_ids, cancelled=False)
+        .annotate(tickets_sold=tickets_sold_subquery())
+        .annotate(seats_left=F('ferry__capacity') - F('tickets_sold'))
+        .order_by('schedule_id')
+        .values_list('schedule_id', 'ferry__capacity', 'tickets_sold', 'seats_left')
+    )
+
+
+def schedule_manifest(schedule):
+    """Active and used tickets of a sailing with their passengers, by seat."""
+    return (
+        Ticket.objects.filter(schedule=schedule, ticket_status__in=['ACTIVE', 'USED'])
+        .select_related('passenger')
+        .order_by('seat_number', 'ticket_id')
+    )
+
+
+def passengers_by_email(emails):
+    """Passengers whose email is in ``emails``."""
+    return Passenger.objects.filter(email__in=list(emails))
+
+
+def upcoming_departures(now, limit=10):
+    """The next sailings from the materialized summary table."""
+    return UpcomingDeparture.objects.filter(departure_time__gte=now).order_by('departure_time')[:limit]
+
+
+def upcoming_trips(user, now):
+    """
+    The user's active tickets and open reservations departing from ``now``,
+    as one UNION query of dicts (``kind``, ``booking_id``, ``route_name``,
+    ``departure_time``, ``seat``, ``state``) ordered by departure.
+    """
+    columns = {
+        'route_name': F('schedule__route__route_name'),
+        'departure_time': F('schedule__departure_time'),
+    }
+    tickets = Ticket.objects.filter(
+        passenger__user=user, ticket_status='ACTIVE', schedule__departure_time__gte=now,
+    ).values(
+        kind=Value('ticket', output_field=CharField()), booking_id=F('ticket_id'), **columns,
+        seat=F('seat_number'), state=F('ticket_status'),
+    )
+    reservations = Reservation.objects.filter(
+        passenger__user=user, status__in=['PENDING', 'CONFIRMED'], schedule__departure_time__gte=now,
+    ).values(
+        kind=Value('reservation', output_field=CharField()), booking_id=F('reservation_id'), **columns,
+        seat=Value(None, output_field=CharField()), state=F('status'),
+    )
+    return tickets.union(reservations, all=True).order_by('departure_time', 'kind', 'booking_id')
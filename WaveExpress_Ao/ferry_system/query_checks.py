@@ -0,0 +1,148 @@
+"""
+Query budgets and index expectations for the key ferry_system querysets.
+
+Each check runs one read path against a seeded database, counts the queries
+it issues and captures the ``EXPLAIN`` output of its main queryset. A check
+fails when it goes over its query budget (an N+1 crept in) or when none of
+the expected indexes shows up in the plan (a filter turned an index lookup
+into a scan). ``ferry_system.tests.test_query_plans`` runs each one as a
+test (``manage.py test ferry_system``); ``manage.py check_query_plans`` runs
+them against a configured database and reports every plan.
+"""
+
+import difflib
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from . import capacity, queries, waitlist
+from .models import FerryAssignment, Passenger, Payment, Reservation, Route, Schedule, Ticket, WaitlistEntry
+
+
+class QueryCheck:
+    """A read path with a query budget and the indexes its plan should use."""
+
+    def __init__(self, name, budget, run, indexes=()):
+        self.name = name
+        self.budget = budget
+        self.run = run
+        # Each entry is a substring of an index name; any one of them must
+        # appear in the EXPLAIN output
+        self.indexes = indexes
+
+    def check(self, fixture):
+        with CaptureQueriesContext(connection) as captured:
+            queryset = self.run(fixture)
+            if queryset is not None:
+                list(queryset)
+        plan = queryset.explain() if queryset is not None and self.indexes else ''
+
+        expected = [f"queries <= {self.budget}"]
+        observed = [
+            f"queries <= {self.budget}" if len(captured) <= self.budget
+            else f"queries = {len(captured)}"
+        ]
+        if self.indexes:
+            wanted = ' | '.join(self.indexes)
+            expected.append(f"uses index {wanted}")
+            uses_index = any(index in plan for index in self.indexes)
+            observed.append(f"uses index {wanted}" if uses_index else f"no index matching {wanted}")
+
+        return {
+            'name': self.name,
+            'passed': expected == observed,
+            'queries': [query['sql'] for query in captured.captured_queries],
+            'plan': plan,
+            'diff': '\n'.join(difflib.unified_diff(
+                expected, observed, fromfile=f"{self.name} (expected)",
+                tofile=f"{self.name} (observed)", lineterm='',
+            )),
+        }
+
+
+def _changelist(model):
+    def run(fixture):
+        request = RequestFactory().get(f"/admin/ferry_system/{model._meta.model_name}/")
+        request.user = fixture['superuser']
+        admin.site._registry[model].changelist_view(request).render()
+    return run
+
+
+def _sellable_capacity(fixture):
+    # Checkout finds the overbooking allowances warmed by prepare_fixture in
+    # process memory
+    capacity.sellable_capacities({pk: 100 for pk in fixture['schedule_ids'][:50]})
+
+
+def build_checks():
+    checks = [
+        QueryCheck(
+            'schedule_search', budget=1, indexes=('schedule_route_departure_idx', 'schedule_departure_idx'),
+            run=lambda f: queries.search_schedules(
+                f['routes'][0].departure_port_id, f['routes'][0].arrival_port_id, f['start'].date(),
+            ),
+        ),
+        QueryCheck(
+            'seat_availability', budget=1, indexes=('ticket_schedule_status_idx',),
+            run=lambda f: queries.seat_availability(f['schedule_ids'][:50]),
+        ),
+        QueryCheck(
+            'schedule_manifest', budget=1, indexes=('ticket_schedule_status_idx',),
+            run=lambda f: queries.schedule_manifest(f['schedule_ids'][0]),
+        ),
+        QueryCheck(
+            'passenger_lookup', budget=1, indexes=('passenger_email',),
+            run=lambda f: queries.passengers_by_email(f['emails']),
+        ),
+        QueryCheck(
+            'upcoming_departures', budget=1, indexes=('upcomingdeparture_departure_time',),
+            run=lambda f: queries.upcoming_departures(f['start']),
+        ),
+        QueryCheck(
+            'upcoming_trips', budget=1,
+            run=lambda f: queries.upcoming_trips(f['superuser'], f['start']),
+        ),
+        QueryCheck(
+            'waitlist_head', budget=1, indexes=('waitlist_queue_idx',),
+            run=lambda f: waitlist.queue_head(f['schedule_ids'][0]).values_list('entry_id', flat=True)[:1],
+        ),
+        QueryCheck('sellable_capacity', budget=0, run=_sellable_capacity),
+    ]
+    # Count, total count and the page itself, plus two queries for the
+    # date hierarchy where there is one; nothing may scale with the page size
+    for model, budget in [
+        (Route, 3), (Schedule, 5), (Ticket, 3), (Reservation, 3),
+        (Payment, 3), (FerryAssignment, 3), (WaitlistEntry, 3),
+    ]:
+        checks.append(QueryCheck(f"admin_{model._meta.model_name}_changelist", budget=budget, run=_changelist(model)))
+    return checks
+
+
+def prepare_fixture(fixture):
+    """Add the superuser and passenger emails the checks use to a ``seed_fleet`` fixture and warm allowances."""
+    if 'superuser' not in fixture:
+        fixture['superuser'] = User.objects.create_superuser(
+            username=f"query-check-{fixture['ferries'][0].pk}", email='', password=None,
+        )
+    if 'emails' not in fixture:
+        fixture['emails'] = list(
+            Passenger.objects.filter(passenger_id__in=fixture['passenger_ids'][:20]).values_list('email', flat=True)
+        )
+    capacity.warm(fixture['schedule_ids'][:50])
+    return fixture
+
+
+def checks_by_name():
+    return {check.name: check for check in build_checks()}
+
+
+def run_checks(fixture, names=None):
+    """Run the checks (optionally only those in ``names``) and return their results."""
+    prepare_fixture(fixture)
+    return [
+        check.check(fixture) for check in build_checks()
+        if not names or check.name in names
+    ]
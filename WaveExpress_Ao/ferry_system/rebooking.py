@@ -0,0 +1,181 @@
+"""
+Rebooking of passengers from disrupted sailings.
+
+The affected tickets and every candidate sailing (later departures between
+the same ports, with their free sellable capacity, see ferry_system.capacity)
+are loaded once. Passengers are then assigned greedily in memory, earliest
+purchase first, to the next departure that still has room. The assignment is committed in one
+transaction: the target schedule rows (not their ferries) are locked, their
+seat inventory is re-checked and each group of tickets is moved with a
+single UPDATE.
+
+Tickets are moved rather than re-issued, so a rebooked passenger keeps
+their ticket number and any payment attached to it.
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import audit
+from .capacity import sellable_capacities
+from .departures import queue_refresh
+from .models import Schedule, Ticket
+from . import tokens
+from .utilization import tickets_sold_subquery
+
+
+def _candidate_schedules(port_pairs, exclude_ids, earliest, latest):
+    """Later sailings between the given port pairs, grouped by pair and ordered by departure."""
+    pair_filter = Q()
+    for departure_port_id, arrival_port_id in port_pairs:
+        pair_filter |= Q(route__departure_port_id=departure_port_id, route__arrival_port_id=arrival_port_id)
+
+    rows = list(
+        Schedule.objects.filter(
+            pair_filter, departure_time__gt=earliest, departure_time__lte=latest, cancelled=False,
+        )
+        .exclude(schedule_id__in=exclude_ids)
+        .annotate(tickets_sold=tickets_sold_subquery())
+        .order_by('departure_time', 'schedule_id')
+        .values_list(
+            'schedule_id', 'route__departure_port_id', 'route__arrival_port_id',
+            'departure_time', 'ferry__capacity', 'tickets_sold',
+        )
+    )
+    sellable = sellable_capacities({row[0]: row[4] for row in rows})
+    candidates = defaultdict(list)
+    for schedule_id, departure_port_id, arrival_port_id, departure, _, sold in rows:
+        candidates[(departure_port_id, arrival_port_id)].append({
+            'schedule_id': schedule_id,
+            'departure_time': departure,
+            'free': max(sellable[schedule_id] - sold, 0),
+        })
+    return candidates
+
+
+def plan_rebooking(tickets, window=datetime.timedelta(days=2), exclude_schedule_ids=()):
+    """
+    Assign each ticket in ``tickets`` to a later sailing between the same ports.
+
+    Only active tickets are considered. Returns ``(assignments, unplaced)``
+    where ``assignments`` maps a target schedule id to the ticket ids moved
+    onto it, in priority order, and ``unplaced`` lists tickets with no room
+    on any candidate sailing within ``window`` of their original departure.
+    Sailings in ``exclude_schedule_ids`` (e.g. the rest of a cancelled
+    batch) are never used as targets.
+    """
+    affected = list(
+        tickets.filter(ticket_status='ACTIVE')
+        .order_by('purchase_date', 'ticket_id')
+        .values_list(
+            'ticket_id', 'schedule_id', 'schedule__departure_time',
+            'schedule__route__departure_port_id', 'schedule__route__arrival_port_id',
+        )
+    )
+    if not affected:
+        return {}, []
+
+    now = timezone.now()
+    port_pairs = {(row[3], row[4]) for row in affected}
+    source_ids = {row[1] for row in affected} | set(exclude_schedule_ids)
+    earliest = max(min(row[2] for row in affected), now)
+    latest = max(row[2] for row in affected) + window
+    candidates = _candidate_schedules(port_pairs, source_ids, earliest, latest)
+
+    # Sailings that filled up stay full, so each pair keeps a cursor past them
+    first_open = defaultdict(int)
+    assignments = defaultdict(list)
+    unplaced = []
+    for ticket_id, _, departure, departure_port_id, arrival_port_id in affected:
+        pair = (departure_port_id, arrival_port_id)
+        options = candidates.get(pair, [])
+        not_before = max(departure, now)
+        index = first_open[pair]
+        while index < len(options) and options[index]['free'] <= 0:
+            index += 1
+        first_open[pair] = index
+
+        target = None
+        for option in options[index:]:
+            if option['departure_time'] > departure + window:
+                break
+            if option['departure_time'] > not_before and option['free'] > 0:
+                target = option
+                break
+        if target is None:
+            unplaced.append(ticket_id)
+            continue
+        target['free'] -= 1
+        assignments[target['schedule_id']].append(ticket_id)
+
+    return dict(assignments), unplaced
+
+
+def commit_rebooking(assignments):
+    """
+    Move the planned tickets, re-checking seat inventory under a row lock.
+
+    Tickets that no longer fit (because seats were sold since the plan was
+    made, or the target sailing was cancelled) are dropped from the end of
+    each group and returned as unplaced.
+    """
+    moved = {}
+    unplaced = []
+    if not assignments:
+        return moved, unplaced
+
+    with transaction.atomic():
+        capacities = sellable_capacities(dict(
+            Schedule.objects.select_for_update(of=('self',))
+            .filter(schedule_id__in=list(assignments), cancelled=False)
+            .order_by('schedule_id')
+            .values_list('schedule_id', 'ferry__capacity')
+        ))
+        sold = dict(
+            Ticket.objects.filter(schedule_id__in=list(assignments))
+            .exclude(ticket_status='CANCELLED')
+            .order_by()
+            .values('schedule_id')
+            .annotate(sold=Count('ticket_id'))
+            .values_list('schedule_id', 'sold')
+        )
+        previous = dict(
+            Ticket.objects.select_for_update()
+            .filter(ticket_id__in=[pk for ticket_ids in assignments.values() for pk in ticket_ids],
+                    ticket_status='ACTIVE')
+            .values_list('ticket_id', 'schedule_id')
+        )
+        for schedule_id, ticket_ids in assignments.items():
+            free = max(capacities.get(schedule_id, 0) - sold.get(schedule_id, 0), 0)
+            still_active = [pk for pk in ticket_ids if pk in previous]
+            accepted = still_active[:free]
+            unplaced.extend(still_active[free:])
+            if accepted:
+                Ticket.objects.filter(ticket_id__in=accepted).update(schedule_id=schedule_id, seat_number=None)
+                audit.record_many(
+                    'ticket', ((pk, previous[pk]) for pk in accepted), 'schedule_id', schedule_id, 'rebooking',
+                )
+                # Tokens name the sailing: those for the old one stop verifying and
+                # passengers fetch a new token for the new sailing
+                tokens.revoke((pk, previous[pk]) for pk in accepted)
+                tokens.reinstate((pk, schedule_id) for pk in accepted)
+                moved[schedule_id] = accepted
+        changed = sorted(set(moved) | {previous[pk] for ticket_ids in moved.values() for pk in ticket_ids})
+        queue_refresh(changed)
+    return moved, unplaced
+
+
+def rebook_passengers(tickets, window=datetime.timedelta(days=2), exclude_schedule_ids=()):
+    """Plan and commit the rebooking of ``tickets``. Returns a summary dict."""
+    assignments, unplaced = plan_rebooking(tickets, window=window, exclude_schedule_ids=exclude_schedule_ids)
+    moved, rejected = commit_rebooking(assignments)
+    return {
+        'rebooked': sum(len(ticket_ids) for ticket_ids in moved.values()),
+        'unplaced': len(unplaced) + len(rejected),
+        'unplaced_ticket_ids': unplaced + rejected,
+        'moves': {str(schedule_id): ticket_ids for schedule_id, ticket_ids in moved.items()},
+    }
@@ -0,0 +1,276 @@
+"""
+All-pairs port distance and typical duration matrix.
+
+Shortest paths over the directed Route graph are computed for two weights:
+the route distance and the historical average sailing time of the route
+(``arrival_time - departure_time`` over its schedules). Both tables are kept
+as flat ``array('d')`` buffers with a port-id index, so a lookup is two dict
+and one array access.
+
+The matrix is built once and shared through the cache (a shared backend, see
+``CACHES`` in settings) as packed bytes under a version key; every process
+keeps its unpacked copy while the shared version is unchanged. Saving a
+route relaxes a copy of the latest published matrix in O(ports**2) when
+that can only shorten paths and publishes it as a new version; anything
+else (deleted routes, longer distances) invalidates it in every process and
+the next lookup rebuilds it. Published matrices are never modified, so
+readers use them without locking.
+
+Writers in every process take a lock in the cache (``cache.add`` on
+``LOCK_KEY``) around reading, building and publishing the shared matrix, so
+two routes saved at once in different processes are both relaxed into it.
+A writer that cannot get the lock within ``LOCK_WAIT`` drops the matrix and
+queues the ``rebuild_route_matrix`` job instead.
+
+Schedule search reports the shortest distance and typical duration between
+the searched ports from this matrix.
+"""
+
+import datetime
+import heapq
+import threading
+import time
+import uuid
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, FloatField
+
+from .jobs import enqueue
+from .models import Port, Route, Schedule
+
+CACHE_KEY = 'ferry_system:route_matrix'
+VERSION_KEY = 'ferry_system:route_matrix:version'
+LOCK_KEY = 'ferry_system:route_matrix:lock'
+# Seconds after which the lock of a writer that died is released
+LOCK_TIMEOUT = 120
+LOCK_WAIT = 10
+INF = float('inf')
+
+
+def _shortest_paths(n, edges):
+    """Dijkstra from every node over ``edges`` ({u: [(v, weight)]}); returns a flat n*n table."""
+    table = array('d', [INF]) * (n * n)
+    for source in range(n):
+        row = source * n
+        table[row + source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > table[row + node]:
+                continue
+            for target, weight in edges.get(node, ()):
+                candidate = cost + weight
+                if candidate < table[row + target]:
+                    table[row + target] = candidate
+                    heapq.heappush(heap, (candidate, target))
+    return table
+
+
+class RouteMatrix:
+    def __init__(self, port_ids, distances, durations, version=None):
+        self.port_ids = list(port_ids)
+        self.index = {port_id: i for i, port_id in enumerate(self.port_ids)}
+        self.distances = distances
+        self.durations = durations
+        self.version = version
+
+    @classmethod
+    def build(cls, version=None):
+        port_ids = list(Port.objects.order_by('port_id').values_list('port_id', flat=True))
+        index = {port_id: i for i, port_id in enumerate(port_ids)}
+
+        # Average sailing time per route in microseconds, as computed by the database
+        typical = dict(
+            Schedule.objects.order_by().values('route_id').annotate(
+                duration=Avg(
+                    ExpressionWrapper(F('arrival_time') - F('departure_time'), output_field=DurationField()),
+                    output_field=FloatField(),
+                )
+            ).values_list('route_id', 'duration')
+        )
+
+        distance_edges, duration_edges = defaultdict(list), defaultdict(list)
+        for route_id, departure_port_id, arrival_port_id, distance in Route.objects.values_list(
+            'route_id', 'departure_port_id', 'arrival_port_id', 'distance'
+        ):
+            u, v = index[departure_port_id], index[arrival_port_id]
+            distance_edges[u].append((v, float(distance)))
+            if typical.get(route_id) is not None:
+                duration_edges[u].append((v, typical[route_id] / 1e6))
+
+        n = len(port_ids)
+        return cls(port_ids, _shortest_paths(n, distance_edges), _shortest_paths(n, duration_edges), version)
+
+    def _lookup(self, table, from_port_id, to_port_id):
+        i, j = self.index.get(from_port_id), self.index.get(to_port_id)
+        if i is None or j is None:
+            return None
+        value = table[i * len(self.port_ids) + j]
+        return None if value == INF else value
+
+    def distance(self, from_port_id, to_port_id):
+        """Shortest sailing distance between two ports, or None if unreachable."""
+        return self._lookup(self.distances, from_port_id, to_port_id)
+
+    def duration(self, from_port_id, to_port_id):
+        """Shortest typical sailing time between two ports as a timedelta, or None."""
+        seconds = self._lookup(self.durations, from_port_id, to_port_id)
+        return None if seconds is None else datetime.timedelta(seconds=seconds)
+
+    def relaxed(self, from_port_id, to_port_id, distance):
+        """
+        A copy of the matrix that accounts for a new or shorter route, in
+        O(ports**2). Returns None when the ports are unknown and a full
+        rebuild is needed instead.
+        """
+        u, v = self.index.get(from_port_id), self.index.get(to_port_id)
+        if u is None or v is None:
+            return None
+        n = len(self.port_ids)
+        table = array('d', self.distances)
+        for i in range(n):
+            to_u = table[i * n + u]
+            if to_u == INF:
+                continue
+            via = to_u + distance
+            for j in range(n):
+                candidate = via + table[v * n + j]
+                if candidate < table[i * n + j]:
+                    table[i * n + j] = candidate
+        # A new route has no schedule history yet, so durations are unaffected
+        return RouteMatrix(self.port_ids, table, self.durations)
+
+    def to_payload(self):
+        return {
+            'port_ids': self.port_ids,
+            'distances': self.distances.tobytes(),
+            'durations': self.durations.tobytes(),
+            'version': self.version,
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        distances, durations = array('d'), array('d')
+        distances.frombytes(payload['distances'])
+        durations.frombytes(payload['durations'])
+        return cls(payload['port_ids'], distances, durations, payload['version'])
+
+
+_matrix = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def _shared_lock():
+    """Hold the cross-process writer lock; yields False if it was not free within ``LOCK_WAIT``."""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    acquired = cache.add(LOCK_KEY, token, LOCK_TIMEOUT)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.05)
+        acquired = cache.add(LOCK_KEY, token, LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+
+
+def _published():
+    """The shared matrix, or None if there is none; reuses this process's copy when it is current."""
+    cached = cache.get_many([CACHE_KEY, VERSION_KEY])
+    payload, version = cached.get(CACHE_KEY), cached.get(VERSION_KEY)
+    if payload is None or version is None or payload['version'] != version:
+        return None
+    if _matrix is not None and _matrix.version == version:
+        return _matrix
+    return RouteMatrix.from_payload(payload)
+
+
+def _publish(matrix):
+    matrix.version = uuid.uuid4().hex
+    cache.set_many({CACHE_KEY: matrix.to_payload(), VERSION_KEY: matrix.version}, None)
+
+
+def _drop_and_rebuild_later():
+    """Drop the shared matrix when the writer lock is stuck, and rebuild it once it is free."""
+    global _matrix
+    _matrix = None
+    cache.delete_many([CACHE_KEY, VERSION_KEY])
+    enqueue('rebuild_route_matrix', dedupe_key='rebuild_route_matrix')
+
+
+def get_route_matrix():
+    """The current matrix, reused in-process while the shared version is unchanged."""
+    global _matrix
+    version = cache.get(VERSION_KEY)
+    matrix = _matrix
+    if matrix is not None and version is not None and matrix.version == version:
+        return matrix
+    with _lock:
+        payload = cache.get(CACHE_KEY)
+        if payload is not None and payload['version'] == version:
+            _matrix = RouteMatrix.from_payload(payload)
+            return _matrix
+        with _shared_lock() as locked:
+            # Another process may have published while this one waited
+            matrix = _published() if locked else None
+            if matrix is None:
+                matrix = RouteMatrix.build()
+                if not locked:
+                    # Serve this lookup without publishing over a writer
+                    return matrix
+                _publish(matrix)
+            _matrix = matrix
+            return _matrix
+
+
+def rebuild_route_matrix():
+    """Rebuild from the database and share the result, e.g. to pick up new schedule history."""
+    global _matrix
+    with _lock, _shared_lock() as locked:
+        if not locked:
+            # Failing lets the job queue retry later
+            raise RuntimeError("The route matrix lock is held by another process.")
+        _matrix = RouteMatrix.build()
+        _publish(_matrix)
+        return _matrix
+
+
+def route_changed(route, previous=None):
+    """
+    Update the matrix after ``route`` was saved. ``previous`` is its former
+    ``(departure_port_id, arrival_port_id, distance)``, or None if it is new.
+    """
+    global _matrix
+    current = (route.departure_port_id, route.arrival_port_id)
+    only_shorter = previous is None or (previous[:2] == current and route.distance <= previous[2])
+    with _lock, _shared_lock() as locked:
+        if not locked:
+            _drop_and_rebuild_later()
+            return
+        relaxed = None
+        if only_shorter:
+            # The latest published matrix includes the routes other processes relaxed
+            matrix = _published()
+            if matrix is not None:
+                relaxed = matrix.relaxed(*current, float(route.distance))
+        if relaxed is None:
+            _matrix = None
+            cache.delete_many([CACHE_KEY, VERSION_KEY])
+        else:
+            _publish(relaxed)
+            _matrix = relaxed
+
+
+def invalidate_route_matrix():
+    global _matrix
+    with _lock, _shared_lock() as locked:
+        if not locked:
+            _drop_and_rebuild_later()
+            return
+        _matrix = None
+        cache.delete_many([CACHE_KEY, VERSION_KEY])
@@ -0,0 +1,83 @@
+"""
+Read-replica routing.
+
+Reads of ferry_system models go to the replica alias named by
+``settings.REPLICA_DATABASE`` when it is configured; writes always go to
+``default``. Reads stay on the primary when
+
+* the request is sticky to the primary (``PrimaryStickinessMiddleware``
+  marks unsafe requests, and the client's next requests for a few seconds,
+  so a passenger sees their own booking right after checkout),
+* code runs inside ``use_primary()``, or
+* the primary has an open transaction, so ``select_for_update()`` and reads
+  that follow a write in the same transaction see consistent data.
+"""
+
+import contextlib
+import contextvars
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ROUTED_APPS = {'ferry_system'}
+
+_sticky = contextvars.ContextVar('ferry_system_primary_sticky', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def is_primary_sticky():
+    return _sticky.get()
+
+
+def set_primary_sticky(value=True):
+    """Pin (or unpin) reads in the current request or task to the primary. Returns a reset token."""
+    return _sticky.set(value)
+
+
+def reset_primary_sticky(token):
+    _sticky.reset(token)
+
+
+@contextlib.contextmanager
+def use_primary():
+    token = _sticky.set(True)
+    try:
+        yield
+    finally:
+        _sticky.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        replica = replica_alias()
+        if (
+            replica is None
+            or model._meta.app_label not in ROUTED_APPS
+            or _sticky.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            # The replica gets its schema through replication, except for
+            # local setups that stand in a separate database for it
+            return getattr(settings, 'REPLICA_MIGRATE', False)
+        return None
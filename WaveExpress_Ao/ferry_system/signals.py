@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import audit, waitlist
+from .departures import queue_refresh
+from .jobs import enqueue
+from .models import Payment, Reservation, Route, Schedule, Ticket
+from .route_matrix import invalidate_route_matrix, route_changed
+from . import tokens
+
+
+@receiver(post_save, sender=Schedule)
+def refresh_schedule_summary(sender, instance, **kwargs):
+    """Keep the upcoming-departures row of a sailing in step with its schedule."""
+    queue_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Ticket)
+def confirm_new_ticket(sender, instance, created, **kwargs):
+    if created and settings.SEND_TICKET_CONFIRMATIONS:
+        enqueue('send_ticket_confirmation', {'ticket_id': instance.pk},
+                dedupe_key=f"send_ticket_confirmation:{instance.pk}")
+
+
+@receiver(pre_save, sender=Route)
+def remember_route_endpoints(sender, instance, **kwargs):
+    instance._previous_endpoints = None
+    if instance.pk is not None:
+        instance._previous_endpoints = (
+            Route.objects.filter(pk=instance.pk)
+            .values_list('departure_port_id', 'arrival_port_id', 'distance')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Route)
+def update_route_matrix(sender, instance, created, **kwargs):
+    """Relax the port matrix for shorter routes, otherwise drop it for a rebuild."""
+    previous = None if created else instance._previous_endpoints
+    if not created and previous is None:
+        transaction.on_commit(invalidate_route_matrix)
+    else:
+        transaction.on_commit(lambda: route_changed(instance, previous))
+
+
+@receiver(post_delete, sender=Route)
+def drop_route_matrix(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_route_matrix)
+
+
+def release_waitlist_seats(sender, instance, created, **kwargs):
+    """Promote the waitlist when a ticket or reservation stops holding its seat."""
+    if created:
+        return
+    initial = instance._audit_initial
+    if sender is Ticket:
+        if initial.get('ticket_status') != 'CANCELLED' and instance.ticket_status == 'CANCELLED':
+            waitlist.seats_released(instance.schedule_id)
+        elif initial.get('schedule_id') not in (None, instance.schedule_id):
+            waitlist.seats_released(initial['schedule_id'])
+    elif initial.get('status') != 'CANCELLED' and instance.status == 'CANCELLED':
+        waitlist.seats_released(instance.schedule_id)
+
+
+def ticket_seats_changed(sender, instance, created, **kwargs):
+    """
+    When a ticket takes, frees or moves a seat, refresh seats left on the
+    home page, and revoke (or reinstate) the ticket's tokens for the sailing
+    it left or was cancelled on.
+    """
+    initial = {} if created else instance._audit_initial
+    was_cancelled = initial.get('ticket_status') == 'CANCELLED'
+    is_cancelled = instance.ticket_status == 'CANCELLED'
+    previous_schedule_id = initial.get('schedule_id')
+    if created or was_cancelled != is_cancelled:
+        schedule_ids = [instance.schedule_id]
+        if is_cancelled:
+            tokens.revoke([(instance.pk, instance.schedule_id)])
+        elif was_cancelled:
+            tokens.reinstate([(instance.pk, instance.schedule_id)])
+    elif previous_schedule_id not in (None, instance.schedule_id):
+        schedule_ids = [previous_schedule_id, instance.schedule_id]
+        tokens.revoke([(instance.pk, previous_schedule_id)])
+        tokens.reinstate([(instance.pk, instance.schedule_id)])
+    else:
+        return
+    queue_refresh(schedule_ids)
+
+
+@receiver(post_delete, sender=Ticket)
+def revoke_deleted_ticket(sender, instance, **kwargs):
+    tokens.revoke([(instance.pk, instance.schedule_id)])
+
+
+def remember_booking_state(sender, instance, **kwargs):
+    instance._audit_initial = audit.snapshot(instance)
+
+
+def audit_booking_save(sender, instance, created, **kwargs):
+    """Log tracked fields that differ from the values the instance was loaded with."""
+    entity_type = sender._meta.model_name
+    current = audit.snapshot(instance)
+    initial = {} if created else instance._audit_initial
+    for field, value in current.items():
+        audit.record(entity_type, instance.pk, field, initial.get(field), value, source='save')
+    instance._audit_initial = current
+
+
+# Connected before the audit hook, which replaces the loaded snapshot
+for booking_model in (Ticket, Reservation):
+    post_save.connect(release_waitlist_seats, sender=booking_model)
+post_save.connect(ticket_seats_changed, sender=Ticket)
+
+for booking_model in (Ticket, Reservation, Payment):
+    post_init.connect(remember_booking_state, sender=booking_model)
+    post_save.connect(audit_booking_save, sender=booking_model)
@@ -0,0 +1,99 @@
+"""
+Synthetic fleet data for query checks and benchmarks.
+
+Everything is written with ``bulk_create`` so a realistically sized fleet
+can be created quickly, typically inside a transaction that is rolled back
+afterwards.
+"""
+
+import datetime
+import random
+import uuid
+
+from django.utils import timezone
+
+from .models import Ferry, Passenger, Port, Route, Schedule, Ticket
+
+
+def seed_fleet(ports=6, ferries=8, days=30, sailings_per_day=4, passengers=500,
+               tickets_per_sailing=40, start=None, seed=0):
+    """
+    Create ports, routes between consecutive ports, ferries, daily sailings
+    and tickets. Returns a dict with the created objects useful to callers.
+    """
+    rng = random.Random(seed)
+    start = start or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    tag = uuid.uuid4().hex[:6]
+
+    # MySQL does not return primary keys from bulk_create, so created rows are
+    # read back by their tag
+    Port.objects.bulk_create(
+        Port(port_name=f"Synthetic Port {tag}-{i}", location=f"Bay {i}") for i in range(ports)
+    )
+    port_objs = list(Port.objects.filter(port_name__startswith=f"Synthetic Port {tag}-").order_by('port_id'))
+    route_objs = []
+    for i, departure_port in enumerate(port_objs):
+        for arrival_port in (port_objs[(i + 1) % ports], port_objs[(i - 1) % ports]):
+            route_objs.append(Route(
+                route_name=f"{departure_port.port_name} - {arrival_port.port_name}",
+                departure_port=departure_port,
+                arrival_port=arrival_port,
+                distance=rng.randint(10, 120),
+            ))
+    Route.objects.bulk_create(route_objs)
+    route_objs = list(Route.objects.filter(departure_port__in=port_objs).order_by('route_id'))
+
+    Ferry.objects.bulk_create(
+        Ferry(ferry_name=f"Synthetic {i}", capacity=rng.choice([60, 120, 200]),
+              model='SX', registration_number=f"SYN-{tag}-{i}")
+        for i in range(ferries)
+    )
+    ferry_objs = list(Ferry.objects.filter(registration_number__startswith=f"SYN-{tag}-").order_by('ferry_id'))
+
+    Passenger.objects.bulk_create(
+        Passenger(passenger_name=f"Passenger {i}", contact_number=f"09{i:09d}",
+                  address='Synthetic', email=f"passenger{i}.{tag}@example.com")
+        for i in range(passengers)
+    )
+    passenger_ids = list(
+        Passenger.objects.filter(email__endswith=f".{tag}@example.com").values_list('passenger_id', flat=True)
+    )
+
+    schedules = []
+    for day in range(days):
+        for ferry_index, ferry in enumerate(ferry_objs):
+            for slot in range(sailings_per_day):
+                departure = start + datetime.timedelta(days=day, hours=5 + slot * 4, minutes=ferry_index)
+                schedules.append(Schedule(
+                    ferry=ferry,
+                    route=route_objs[(ferry_index + slot) % len(route_objs)],
+                    departure_time=departure,
+                    arrival_time=departure + datetime.timedelta(hours=2, minutes=rng.randint(0, 60)),
+                    price=rng.choice([350, 800, 1500]),
+                    reserve=rng.random() < 0.5,
+                ))
+    Schedule.objects.bulk_create(schedules, batch_size=1000)
+    schedule_rows = list(
+        Schedule.objects.filter(ferry__in=ferry_objs).values_list('schedule_id', 'ferry__capacity')
+    )
+
+    tickets = []
+    for schedule_id, capacity in schedule_rows:
+        for seat in range(min(tickets_per_sailing, capacity)):
+            tickets.append(Ticket(
+                schedule_id=schedule_id,
+                passenger_id=rng.choice(passenger_ids),
+                seat_number=str(seat + 1),
+                ticket_status=rng.choices(['ACTIVE', 'USED', 'CANCELLED'], [80, 15, 5])[0],
+                payment_status='PAID',
+            ))
+    Ticket.objects.bulk_create(tickets, batch_size=2000)
+
+    return {
+        'ports': port_objs,
+        'routes': route_objs,
+        'ferries': ferry_objs,
+        'schedule_ids': [row[0] for row in schedule_rows],
+        'passenger_ids': passenger_ids,
+        'start': start,
+    }
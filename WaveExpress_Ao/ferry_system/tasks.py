@@ -0,0 +1,94 @@
+"""
+Background tasks run by ``manage.py run_workers``.
+
+Enqueue them with ``ferry_system.jobs.enqueue(name, payload, dedupe_key)``.
+"""
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .booking import expire_reservations
+from .capacity import rollup_no_shows
+from .departures import refresh_departure, refresh_upcoming_departures
+from .jobs import task
+from .models import Ticket, WaitlistEntry
+from .route_matrix import rebuild_route_matrix
+from .waitlist import expire_holds
+
+
+@task('send_ticket_confirmation')
+def send_ticket_confirmation(ticket_id):
+    ticket = (
+        Ticket.objects.select_related('passenger', 'schedule__route')
+        .filter(ticket_id=ticket_id, ticket_status='ACTIVE')
+        .first()
+    )
+    if ticket is None or not ticket.passenger.email:
+        return
+    schedule = ticket.schedule
+    send_mail(
+        subject=f"WaveExpress booking confirmation - Ticket #{ticket.ticket_id}",
+        message=(
+            f"Dear {ticket.passenger.passenger_name},\n\n"
+            f"Your ticket #{ticket.ticket_id} for {schedule.route.route_name} departing "
+            f"{schedule.departure_time:%Y-%m-%d %H:%M} is confirmed"
+            f"{f', seat {ticket.seat_number}' if ticket.seat_number else ''}.\n\n"
+            "Thank you for sailing with WaveExpress."
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[ticket.passenger.email],
+    )
+
+
+@task('refresh_departure')
+def refresh_departure_task(schedule_id):
+    refresh_departure(schedule_id)
+
+
+@task('refresh_upcoming_departures')
+def refresh_upcoming_departures_task():
+    refresh_upcoming_departures()
+
+
+@task('rebuild_route_matrix')
+def rebuild_route_matrix_task():
+    rebuild_route_matrix()
+
+
+@task('send_waitlist_offer')
+def send_waitlist_offer(entry_id):
+    entry = (
+        WaitlistEntry.objects.select_related('passenger', 'schedule__route')
+        .filter(entry_id=entry_id, status='HELD')
+        .first()
+    )
+    if entry is None or not entry.passenger.email:
+        return
+    schedule = entry.schedule
+    send_mail(
+        subject=f"WaveExpress waitlist - a seat is available on {schedule.route.route_name}",
+        message=(
+            f"Dear {entry.passenger.passenger_name},\n\n"
+            f"A seat on {schedule.route.route_name} departing {schedule.departure_time:%Y-%m-%d %H:%M} "
+            f"is being held for you until {entry.hold_expires_at:%Y-%m-%d %H:%M} UTC. "
+            "Accept it from your account before then to receive your ticket.\n\n"
+            "Thank you for sailing with WaveExpress."
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[entry.passenger.email],
+    )
+
+
+@task('expire_waitlist_holds')
+def expire_waitlist_holds_task():
+    expire_holds()
+
+
+@task('expire_reservations')
+def expire_reservations_task():
+    expire_reservations()
+
+
+@task('rollup_no_shows')
+def rollup_no_shows_task():
+    rollup_no_shows()
@@ -0,0 +1,56 @@
+"""Incremental runs of the booking fact export (see ferry_system.exports)."""
+
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from ferry_system.exports import export_bookings, read_watermark
+from ferry_system.models import Ticket
+from ferry_system.synthetic import seed_fleet
+
+
+class IncrementalExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed_fleet(ports=3, ferries=2, days=2, passengers=20, tickets_per_sailing=5)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self):
+        return export_bookings(self.directory, format='csv')
+
+    def new_ticket(self, **kwargs):
+        return Ticket.objects.create(
+            schedule_id=self.fixture['schedule_ids'][0], passenger_id=self.fixture['passenger_ids'][0], **kwargs
+        )
+
+    def test_runs_without_new_rows_export_nothing(self):
+        self.assertEqual(self.export()['rows'], Ticket.objects.count())
+        self.assertEqual(self.export()['rows'], 0)
+        self.assertEqual(self.export()['rows'], 0)
+
+    def test_new_and_changed_tickets(self):
+        self.export()
+        ticket = self.new_ticket()
+        self.assertEqual(self.export(), {'rows': 1, 'new': 1, 'changed': 0, 'files': 1})
+        # Audit events are written when the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.ticket_status = 'CANCELLED'
+            ticket.save()
+        self.assertEqual(self.export(), {'rows': 1, 'new': 0, 'changed': 1, 'files': 1})
+        self.assertEqual(self.export()['rows'], 0)
+
+    def test_late_commit_below_the_watermark(self):
+        top = Ticket.objects.order_by('-ticket_id').values_list('ticket_id', flat=True)[0]
+        # Id top + 1 is taken by a transaction that commits after the first run
+        self.new_ticket(ticket_id=top + 2)
+        self.assertEqual(self.export()['rows'], Ticket.objects.count())
+        self.assertEqual(read_watermark(self.directory)['ticket_gaps'], [top + 1])
+
+        self.new_ticket(ticket_id=top + 1)
+        self.assertEqual(self.export(), {'rows': 1, 'new': 1, 'changed': 0, 'files': 1})
+        self.assertEqual(read_watermark(self.directory)['ticket_gaps'], [])
+        self.assertEqual(self.export()['rows'], 0)
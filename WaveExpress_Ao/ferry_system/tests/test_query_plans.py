@@ -0,0 +1,67 @@
+"""
+Query budgets and index use of the key read paths (see ferry_system.query_checks).
+
+A failure means a read path issues more (or fewer) queries than budgeted, an
+N+1 crept in, or its main queryset stopped using the expected index.
+"""
+
+from django.test import TestCase, override_settings
+
+from ferry_system.query_checks import checks_by_name, prepare_fixture
+from ferry_system.synthetic import seed_fleet
+
+CHECKS = checks_by_name()
+
+
+# Admin pages link static files, which have no collectstatic manifest in tests
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = prepare_fixture(seed_fleet(ports=4, ferries=4, days=7, passengers=100, tickets_per_sailing=10))
+
+    def assertQueryCheck(self, name):
+        check = CHECKS[name]
+        with self.assertNumQueries(check.budget):
+            queryset = check.run(self.fixture)
+            if queryset is not None:
+                list(queryset)
+        if check.indexes:
+            plan = queryset.explain()
+            self.assertTrue(
+                any(index in plan for index in check.indexes),
+                f"{name}: no index matching {' | '.join(check.indexes)} in\n{plan}",
+            )
+
+    def test_schedule_search(self):
+        self.assertQueryCheck('schedule_search')
+
+    def test_seat_availability(self):
+        self.assertQueryCheck('seat_availability')
+
+    def test_schedule_manifest(self):
+        self.assertQueryCheck('schedule_manifest')
+
+    def test_passenger_lookup(self):
+        self.assertQueryCheck('passenger_lookup')
+
+    def test_upcoming_departures(self):
+        self.assertQueryCheck('upcoming_departures')
+
+    def test_upcoming_trips(self):
+        self.assertQueryCheck('upcoming_trips')
+
+    def test_waitlist_head(self):
+        self.assertQueryCheck('waitlist_head')
+
+    def test_sellable_capacity(self):
+        self.assertQueryCheck('sellable_capacity')
+
+    def test_admin_changelists(self):
+        for name in CHECKS:
+            if name.startswith('admin_'):
+                with self.subTest(name):
+                    self.assertQueryCheck(name)
@@ -0,0 +1,117 @@
+"""
+Read-replica routing (see ferry_system.routers).
+
+Needs a replica alias, so it is skipped under the default settings; run it
+with ``--settings=WaveExpress_Ao.settings_sqlite_replica`` (two SQLite
+files) or with ``WAVEEXPRESS_REPLICA_HOST`` set (a MySQL replica, which tests
+mirror to the primary). These are TransactionTestCases: the transaction a
+TestCase wraps each test in would pin every read to the primary.
+"""
+
+import datetime
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ferry_system.middleware import STICKY_COOKIE
+from ferry_system.models import Ferry, Passenger, Port, Route, Schedule
+from ferry_system.queries import upcoming_departures
+from ferry_system.routers import replica_alias, use_primary
+
+REPLICA = replica_alias()
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+@skipUnless(REPLICA, "needs a replica alias, e.g. --settings=WaveExpress_Ao.settings_sqlite_replica")
+class ReplicaRoutingTests(TransactionTestCase):
+    # The test runner sets up every alias listed here, even for skipped classes
+    databases = {DEFAULT_DB_ALIAS, REPLICA} if REPLICA else {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        departure_port = Port.objects.create(port_name='North', location='-')
+        arrival_port = Port.objects.create(port_name='South', location='-')
+        route = Route.objects.create(route_name='North - South', departure_port=departure_port,
+                                     arrival_port=arrival_port, distance=40)
+        ferry = Ferry.objects.create(ferry_name='Routing', capacity=50, model='SX', registration_number='RT-1')
+        departure = timezone.now() + datetime.timedelta(days=1)
+        self.schedule = Schedule.objects.create(
+            ferry=ferry, route=route, departure_time=departure,
+            arrival_time=departure + datetime.timedelta(hours=2), price=500, reserve=True,
+        )
+        user = User.objects.create_user('routing', 'routing@example.com', 'secret')
+        Passenger.objects.create(user=user, passenger_name='Routing', contact_number='0900',
+                                 address='-', email='routing@example.com')
+        self.client = Client()
+        self.client.force_login(user)
+
+    def served_by(self, func):
+        """``(result, primary queries, replica queries)`` of ``func()``."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            result = func()
+        return result, [query['sql'] for query in primary], [query['sql'] for query in replica]
+
+    def assertNoWrites(self, queries):
+        writes = [sql for sql in queries if sql.lstrip().upper().startswith(WRITES)]
+        self.assertEqual(writes, [], "writes sent to the replica")
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(Schedule), REPLICA)
+        self.assertEqual(router.db_for_write(Schedule), DEFAULT_DB_ALIAS)
+        # Only ferry_system models are routed
+        self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+        with use_primary():
+            self.assertEqual(router.db_for_read(Schedule), DEFAULT_DB_ALIAS)
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Schedule), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Schedule), REPLICA)
+
+    def test_search_reads_use_the_replica(self):
+        _, primary, replica = self.served_by(lambda: list(upcoming_departures(timezone.now())))
+        self.assertEqual(primary, [])
+        self.assertNotEqual(replica, [])
+
+    def test_writes_never_hit_the_replica(self):
+        def write():
+            port = Port.objects.create(port_name='East', location='-')
+            Port.objects.filter(pk=port.pk).update(location='Bay')
+            Port.objects.bulk_create([Port(port_name='West', location='-')])
+            port.delete()
+            with transaction.atomic():
+                Schedule.objects.select_for_update().filter(pk=self.schedule.pk).update(price=600)
+
+        _, primary, replica = self.served_by(write)
+        self.assertNoWrites(replica)
+        self.assertNotEqual(primary, [])
+
+    def test_sticky_primary_after_checkout(self):
+        def checkout():
+            response = self.client.post(reverse('ferry_system:reserve_seat_api', args=[self.schedule.pk]))
+            self.assertEqual(response.status_code, 201, response.content)
+            response = self.client.post(
+                reverse('ferry_system:pay_reservation_api', args=[response.json()['reservation_id']])
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertIn(STICKY_COOKIE, response.cookies)
+            return response.json()['ticket_id']
+
+        ticket_id, _, replica = self.served_by(checkout)
+        self.assertEqual(replica, [])
+
+        # The same client reads its new ticket from the primary right after
+        token = reverse('ferry_system:ticket_token_api', args=[ticket_id])
+        response, primary, replica = self.served_by(lambda: self.client.get(token))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(replica, [])
+        self.assertNotEqual(primary, [])
+
+        # Once the cookie expired its reads go to the replica again
+        self.client.cookies[STICKY_COOKIE] = str(timezone.now().timestamp() - 1)
+        _, _, replica = self.served_by(lambda: self.client.get(token))
+        self.assertNotEqual(replica, [])
+        self.assertNoWrites(replica)
@@ -0,0 +1,175 @@
+"""
+Per-client rate limiting and request coalescing for hot read endpoints.
+
+``throttle(scope)`` admits each client (the user, or the remote address for
+anonymous requests) through a token bucket kept in process memory, and
+answers 429 with ``Retry-After`` once the bucket is empty. ``coalesce(key,
+func)`` makes concurrent identical lookups share one computation: the first
+caller runs ``func`` while the others wait for its result, which is then
+served for ``COALESCE_WINDOW`` seconds. Both are per process, like the
+check-in sessions, so a deployment with N workers allows N times the rate.
+
+Rejected, coalesced and computed requests are counted in ``counters()``.
+"""
+
+import functools
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.http import JsonResponse
+
+DEFAULT_RATE = (5.0, 20)
+MAX_CLIENTS = 100_000
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def counters():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def reset_counters():
+    with _counters_lock:
+        _counters.clear()
+
+
+class TokenBucketLimiter:
+    """Token buckets refilled at ``rate`` per second up to ``burst``, one per client key."""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        """Take a token for ``key``. Returns ``(allowed, seconds_until_next_token)``."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                # Least recently seen clients first; a fresh bucket is full anyway
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(scope):
+    with _limiters_lock:
+        limiter = _limiters.get(scope)
+        if limiter is None:
+            rate, burst = getattr(settings, 'FERRY_RATE_LIMITS', {}).get(scope, DEFAULT_RATE)
+            limiter = _limiters[scope] = TokenBucketLimiter(rate, burst)
+        return limiter
+
+
+def client_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def throttle(scope):
+    """Rate-limit a view per client with the ``FERRY_RATE_LIMITS[scope]`` bucket."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            allowed, retry_after = get_limiter(scope).allow(client_key(request))
+            if not allowed:
+                count(f"{scope}.rejected")
+                response = JsonResponse({'error': "Too many requests."}, status=429)
+                response['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'expires')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires = math.inf
+
+
+class SingleFlight:
+    """Run one computation per key at a time and share its result for ``window`` seconds."""
+
+    def __init__(self, window):
+        self.window = window
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Return ``(result, shared)``; ``shared`` is True when another caller computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.expires > time.monotonic():
+                shared = True
+            else:
+                call = self._calls[key] = _Call()
+                shared = False
+                if len(self._calls) > 1024:
+                    self._prune()
+
+        if shared:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as exc:
+            call.error = exc
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.expires = time.monotonic() + self.window if call.error is None else 0
+            call.event.set()
+        return call.result, False
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [key for key, call in self._calls.items() if call.expires <= now]:
+            del self._calls[key]
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def coalesce(key, func):
+    """``func()``, shared with concurrent callers of the same ``key`` (see ``SingleFlight``)."""
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                _flight = SingleFlight(getattr(settings, 'COALESCE_WINDOW', 1.0))
+    result, shared = _flight.do(key, func)
+    count(f"{key[0]}.coalesced" if shared else f"{key[0]}.computed")
+    return result
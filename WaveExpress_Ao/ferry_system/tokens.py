@@ -0,0 +1,151 @@
+"""
+Signed, compact ticket tokens.
+
+A token carries ticket id, schedule id, seat and expiry, signed with the
+project ``SECRET_KEY`` through ``django.core.signing``, and is short enough
+for a QR code. Gates verify authenticity, expiry and sailing without reading
+the Ticket. A token is revoked once its ticket is no longer boardable on the
+token's sailing: cancelled, deleted, or moved to another sailing by
+rebooking. Those few tickets are recorded as ``TicketRevocation`` rows.
+
+Each process keeps the revoked ticket ids of the sailings it verifies in
+memory. Recording a revocation bumps a generation counter in the shared
+cache, which processes read at most every ``CHECK_INTERVAL`` seconds, so
+verification costs no query in the common case and a revocation reaches
+every process within that interval (at once in the process that made it).
+"""
+
+import threading
+import time
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TicketRevocation
+
+SALT = 'ferry_system.ticket'
+GENERATION_KEY = 'ferry_system:token_revocations'
+CHECK_INTERVAL = 2
+
+OK = 'OK'
+INVALID = 'INVALID'
+EXPIRED = 'EXPIRED'
+WRONG_SAILING = 'WRONG_SAILING'
+REVOKED = 'REVOKED'
+
+_signer = signing.Signer(salt=SALT)
+
+
+def make_ticket_token(ticket_id, schedule_id, seat_number, expires_at):
+    payload = [ticket_id, schedule_id, seat_number or '', int(expires_at.timestamp())]
+    return _signer.sign_object(payload, compress=True)
+
+
+def ticket_token(ticket):
+    """Token for ``ticket``, valid until its sailing arrives."""
+    return make_ticket_token(ticket.ticket_id, ticket.schedule_id, ticket.seat_number, ticket.schedule.arrival_time)
+
+
+class _Revocations:
+    """Process-local revoked ticket ids per sailing, dropped when the shared generation moves."""
+
+    def __init__(self):
+        self._sets = {}
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return
+        generation = cache.get(GENERATION_KEY, 0)
+        with self._lock:
+            if generation != self._generation:
+                self._sets = {}
+                self._generation = generation
+            self._checked_at = now
+
+    def ticket_ids(self, schedule_id):
+        self._current()
+        sets = self._sets
+        revoked = sets.get(schedule_id)
+        if revoked is None:
+            revoked = frozenset(
+                TicketRevocation.objects.filter(schedule_id=schedule_id).values_list('ticket_id', flat=True)
+            )
+            with self._lock:
+                # Not if a revocation replaced the sets while this one was read
+                if self._sets is sets:
+                    sets[schedule_id] = revoked
+        return revoked
+
+    def changed(self):
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, None)
+        with self._lock:
+            self._sets = {}
+            self._checked_at = 0.0
+
+
+_revocations = _Revocations()
+
+
+def revoked_ticket_ids(schedule_id):
+    """Ticket ids whose tokens for ``schedule_id`` are revoked."""
+    return _revocations.ticket_ids(schedule_id)
+
+
+def revoke(pairs):
+    """Revoke the tokens of ``(ticket_id, schedule_id)`` pairs, once the current transaction commits."""
+    pairs = set(pairs)
+    if pairs:
+        TicketRevocation.objects.bulk_create(
+            [TicketRevocation(ticket_id=ticket_id, schedule_id=schedule_id) for ticket_id, schedule_id in pairs],
+            batch_size=1000, ignore_conflicts=True,
+        )
+        transaction.on_commit(_revocations.changed)
+
+
+def reinstate(pairs):
+    """Let the tokens of ``(ticket_id, schedule_id)`` pairs verify again, e.g. a ticket moved back."""
+    pairs = set(pairs)
+    if pairs:
+        for schedule_id in {schedule_id for _, schedule_id in pairs}:
+            TicketRevocation.objects.filter(
+                schedule_id=schedule_id,
+                ticket_id__in=[ticket_id for ticket_id, pair_schedule_id in pairs if pair_schedule_id == schedule_id],
+            ).delete()
+        transaction.on_commit(_revocations.changed)
+
+
+def verify_ticket_token(token, schedule_id=None, check_revocation=True, now=None):
+    """
+    Verify a token, optionally for boarding ``schedule_id``.
+
+    Returns ``(status, ticket)`` where ``ticket`` is a dict with the decoded
+    fields (``None`` when the token is not authentic).
+    """
+    try:
+        ticket_id, token_schedule_id, seat_number, expires = _signer.unsign_object(token)
+    except (signing.BadSignature, ValueError, TypeError):
+        return INVALID, None
+
+    ticket = {
+        'ticket_id': ticket_id,
+        'schedule_id': token_schedule_id,
+        'seat_number': seat_number or None,
+        'expires': expires,
+    }
+    now = now or timezone.now()
+    if expires < now.timestamp():
+        return EXPIRED, ticket
+    if schedule_id is not None and token_schedule_id != schedule_id:
+        return WRONG_SAILING, ticket
+    if check_revocation and ticket_id in revoked_ticket_ids(token_schedule_id):
+        return REVOKED, ticket
+    return OK, ticket
@@ -4,5 +4,22 @@ from . import views
 app_name = 'ferry_system'
 
 urlpatterns = [
-    # Empty for now - will be populated when views are implemented
+    path('api/checkin/<int:schedule_id>/manifest/', views.checkin_manifest_api, name='checkin_manifest_api'),
+    path('api/checkin/<int:schedule_id>/scan/', views.checkin_scan_api, name='checkin_scan_api'),
+    path('api/checkin/<int:schedule_id>/close/', views.checkin_close_api, name='checkin_close_api'),
+    path('api/disruptions/cancel/', views.cancel_sailings_api, name='cancel_sailings_api'),
+    path('api/imports/bookings/', views.import_bookings_api, name='import_bookings_api'),
+    path('api/ports/matrix/', views.port_matrix_api, name='port_matrix_api'),
+    path('api/reservations/<int:reservation_id>/pay/', views.pay_reservation_api, name='pay_reservation_api'),
+    path('api/schedules/search/', views.schedule_search_api, name='schedule_search_api'),
+    path('api/schedules/<int:schedule_id>/availability/', views.schedule_availability_api,
+         name='schedule_availability_api'),
+    path('api/schedules/<int:schedule_id>/reserve/', views.reserve_seat_api, name='reserve_seat_api'),
+    path('api/throttling/stats/', views.throttling_stats_api, name='throttling_stats_api'),
+    path('api/tickets/<int:ticket_id>/token/', views.ticket_token_api, name='ticket_token_api'),
+    path('api/tickets/verify/', views.verify_ticket_token_api, name='verify_ticket_token_api'),
+    path('api/utilization/', views.fleet_utilization_api, name='fleet_utilization_api'),
+    path('api/waitlist/<int:schedule_id>/join/', views.join_waitlist_api, name='join_waitlist_api'),
+    path('api/waitlist/entries/<int:entry_id>/accept/', views.accept_waitlist_hold_api, name='accept_waitlist_hold_api'),
+    path('api/waitlist/entries/<int:entry_id>/leave/', views.leave_waitlist_api, name='leave_waitlist_api'),
 ]
@@ -0,0 +1,126 @@
+"""
+Fleet utilization timelines.
+
+Builds, for every ferry, the time in service, the idle gaps between sailings
+and the load factor of each sailing over a date range. All schedules in the
+range are read with a single ordered query (ticket counts are joined through
+an aggregate subquery) and streamed, so the whole fleet is processed in one
+pass without loading Schedule or Ticket objects.
+"""
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Ferry, Schedule, Ticket
+
+
+def tickets_sold_subquery():
+    """Number of non-cancelled tickets for the outer schedule."""
+    tickets = (
+        Ticket.objects.filter(schedule=OuterRef('pk'))
+        .exclude(ticket_status='CANCELLED')
+        .order_by()
+        .values('schedule')
+        .annotate(sold=Count('pk'))
+        .values('sold')
+    )
+    return Coalesce(Subquery(tickets, output_field=IntegerField()), Value(0))
+
+
+def _new_timeline(ferry_id, ferry_name, capacity, start):
+    return {
+        'ferry_id': ferry_id,
+        'ferry_name': ferry_name,
+        'capacity': capacity,
+        'in_service_seconds': 0,
+        'idle_seconds': 0,
+        'utilization': 0.0,
+        'load_factor': None,
+        'gaps': [],
+        'sailings': [],
+        # Internal cursor state, removed by _close_timeline
+        '_cursor': start,
+        '_seats_sold': 0,
+        '_seats_offered': 0,
+    }
+
+
+def _add_gap(timeline, gap_start, gap_end):
+    seconds = (gap_end - gap_start).total_seconds()
+    if seconds > 0:
+        timeline['gaps'].append({
+            'start': gap_start,
+            'end': gap_end,
+            'seconds': round(seconds),
+        })
+        timeline['idle_seconds'] += seconds
+
+
+def _close_timeline(timeline, end, window_seconds):
+    _add_gap(timeline, timeline['_cursor'], end)
+    timeline['utilization'] = round(timeline['in_service_seconds'] / window_seconds, 4)
+    timeline['in_service_seconds'] = round(timeline['in_service_seconds'])
+    timeline['idle_seconds'] = round(timeline['idle_seconds'])
+    if timeline['_seats_offered']:
+        timeline['load_factor'] = round(timeline['_seats_sold'] / timeline['_seats_offered'], 4)
+    del timeline['_cursor'], timeline['_seats_sold'], timeline['_seats_offered']
+    return timeline
+
+
+def fleet_utilization(start, end, ferry_ids=None, chunk_size=2000):
+    """
+    Return a utilization timeline for each ferry between ``start`` and ``end``.
+
+    Sailings are clipped to the window and overlapping sailings of the same
+    ferry are merged, so in-service and idle time always add up to the length
+    of the window. Ferries without any sailing get a single idle gap.
+    """
+    if start >= end:
+        raise ValueError("The start of the range must be before its end.")
+    window_seconds = (end - start).total_seconds()
+
+    ferries = Ferry.objects.order_by('ferry_id')
+    if ferry_ids is not None:
+        ferries = ferries.filter(ferry_id__in=ferry_ids)
+    timelines = {
+        ferry_id: _new_timeline(ferry_id, name, capacity, start)
+        for ferry_id, name, capacity in ferries.values_list('ferry_id', 'ferry_name', 'capacity')
+    }
+
+    rows = (
+        Schedule.objects.filter(
+            ferry_id__in=list(timelines),
+            departure_time__lt=end,
+            arrival_time__gt=start,
+            cancelled=False,
+        )
+        .annotate(tickets_sold=tickets_sold_subquery())
+        .order_by('ferry_id', 'departure_time')
+        .values_list('ferry_id', 'schedule_id', 'departure_time', 'arrival_time', 'tickets_sold')
+    )
+
+    for ferry_id, schedule_id, departure, arrival, sold in rows.iterator(chunk_size=chunk_size):
+        timeline = timelines[ferry_id]
+        capacity = timeline['capacity']
+        timeline['sailings'].append({
+            'schedule_id': schedule_id,
+            'departure_time': departure,
+            'arrival_time': arrival,
+            'tickets_sold': sold,
+            'load_factor': round(sold / capacity, 4) if capacity else None,
+        })
+        timeline['_seats_sold'] += sold
+        timeline['_seats_offered'] += capacity
+
+        # Merge the clipped interval into the running timeline
+        interval_start = max(departure, start)
+        interval_end = min(arrival, end)
+        cursor = timeline['_cursor']
+        if interval_start > cursor:
+            _add_gap(timeline, cursor, interval_start)
+            cursor = interval_start
+        if interval_end > cursor:
+            timeline['in_service_seconds'] += (interval_end - cursor).total_seconds()
+            timeline['_cursor'] = interval_end
+
+    return [_close_timeline(timeline, end, window_seconds) for timeline in timelines.values()]
@@ -0,0 +1,21 @@
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_moment(value, end_of_day=False):
+    """Parse a date or datetime string into an aware datetime."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.datetime.combine(day, datetime.time.min)
+        if end_of_day:
+            moment += datetime.timedelta(days=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
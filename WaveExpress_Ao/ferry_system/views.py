@@ -1,6 +1,307 @@
+import datetime
+import io
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 from .models import *
+from . import booking, checkin, throttling, tokens, waitlist
+from .capacity import sellable_capacity, sellable_seats_left
+from .disruptions import cancel_sailings, disrupted_schedules
+from .imports import import_bookings
+from .queries import search_schedules, seat_availability
+from .route_matrix import get_route_matrix
+from .utilization import fleet_utilization
+from .utils import parse_moment
+
+
+def _parse_range(request, default_days=30):
+    """Read the ``start``/``end`` query parameters, defaulting to the next ``default_days``."""
+    start = parse_moment(request.GET.get('start'))
+    end = parse_moment(request.GET.get('end'), end_of_day=True)
+    if start is None:
+        start = timezone.now()
+    if end is None:
+        end = start + datetime.timedelta(days=default_days)
+    if start >= end:
+        raise ValueError("The start of the range must be before its end.")
+    return start, end
+
+
+@staff_member_required
+def fleet_utilization_api(request):
+    """Per-ferry service time, idle gaps and load factor as JSON"""
+    try:
+        start, end = _parse_range(request)
+        ferry_ids = [int(pk) for pk in request.GET.getlist('ferry')] or None
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    timelines = fleet_utilization(start, end, ferry_ids=ferry_ids)
+    return JsonResponse({'start': start, 'end': end, 'ferries': timelines})
+
+
+@staff_member_required
+@require_POST
+def cancel_sailings_api(request):
+    """Cancel one or more sailings and refund their bookings"""
+    try:
+        route = request.POST.get('route')
+        schedules = disrupted_schedules(
+            schedule_ids=[int(pk) for pk in request.POST.getlist('schedule')],
+            route=int(route) if route else None,
+            start=parse_moment(request.POST.get('start')),
+            end=parse_moment(request.POST.get('end'), end_of_day=True),
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    return JsonResponse(cancel_sailings(schedules, rebook=bool(request.POST.get('rebook'))))
+
+
+@staff_member_required
+def checkin_manifest_api(request, schedule_id):
+    """Snapshot of boardable ticket ids for gate devices to cache"""
+    session = checkin.get_session(schedule_id)
+    if request.GET.get('reload'):
+        session.load()
+    return JsonResponse(session.snapshot())
+
+
+@staff_member_required
+@require_POST
+def checkin_scan_api(request, schedule_id):
+    """Validate scanned ticket ids or signed ticket tokens against the in-memory manifest"""
+    session = checkin.get_session(schedule_id)
+    results = []
+    for value in request.POST.getlist('ticket'):
+        try:
+            result = session.scan(int(value))
+        except ValueError:
+            result = checkin.INVALID
+        results.append({'ticket': value, 'result': result})
+    for value in request.POST.getlist('token'):
+        result, ticket = tokens.verify_ticket_token(value, schedule_id=schedule_id)
+        if result == tokens.OK:
+            result = session.scan(ticket['ticket_id'])
+        results.append({'token': value, 'result': result})
+    return JsonResponse({'results': results, 'pending': len(session.pending)})
+
+
+@staff_member_required
+@require_POST
+def checkin_close_api(request, schedule_id):
+    """Flush pending scans and drop the sailing's check-in session"""
+    return JsonResponse({'flushed': checkin.close_session(schedule_id)})
+
+
+@login_required
+def ticket_token_api(request, ticket_id):
+    """Signed QR token for one of the user's tickets"""
+    ticket = get_object_or_404(Ticket.objects.select_related('schedule', 'passenger'), pk=ticket_id)
+    if ticket.passenger.user_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({'error': "Not your ticket."}, status=403)
+    if ticket.ticket_status != 'ACTIVE':
+        return JsonResponse({'error': "Ticket is not active."}, status=400)
+    return JsonResponse({'ticket_id': ticket.ticket_id, 'token': tokens.ticket_token(ticket)})
+
+
+@staff_member_required
+def verify_ticket_token_api(request):
+    """Verify a ticket token without reading the ticket"""
+    schedule = request.GET.get('schedule')
+    try:
+        schedule_id = int(schedule) if schedule else None
+    except ValueError:
+        return JsonResponse({'error': f"Invalid schedule: {schedule}"}, status=400)
+    result, ticket = tokens.verify_ticket_token(request.GET.get('token', ''), schedule_id=schedule_id)
+    return JsonResponse({'result': result, 'ticket': ticket})
+
+
+@staff_member_required
+@require_POST
+def import_bookings_api(request):
+    """Import an uploaded CSV or JSON lines booking batch"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': "Upload the batch as 'file'."}, status=400)
+    format = request.POST.get('format') or ('jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if format not in ('csv', 'jsonl'):
+        return JsonResponse({'error': f"Unknown format: {format}"}, status=400)
+
+    rejects = io.StringIO()
+    stats = import_bookings(io.TextIOWrapper(upload.file, encoding='utf-8', newline=''),
+                            format=format, reject_stream=rejects)
+    stats['rejects_csv'] = rejects.getvalue()
+    return JsonResponse(stats)
+
+
+def _availability(schedule_id):
+    row = seat_availability([schedule_id]).first()
+    if row is None:
+        return None
+    _, capacity, tickets_sold, _ = row
+    sellable = sellable_capacity(schedule_id, capacity)
+    held = waitlist.active_holds(schedule_id)
+    return {
+        'schedule_id': schedule_id,
+        'capacity': capacity,
+        'sellable_capacity': sellable,
+        'tickets_sold': tickets_sold,
+        'seats_held': held,
+        'seats_available': max(sellable - tickets_sold - held, 0),
+    }
+
+
+@throttling.throttle('availability')
+def schedule_availability_api(request, schedule_id):
+    """Seats left on a sailing; concurrent refreshes share one computation"""
+    availability = throttling.coalesce(('availability', schedule_id), lambda: _availability(schedule_id))
+    if availability is None:
+        return JsonResponse({'error': "Schedule not found or cancelled."}, status=404)
+    return JsonResponse(availability)
+
+
+def _search(from_port, to_port, day):
+    schedules = list(
+        search_schedules(from_port, to_port, day).values_list(
+            'schedule_id', 'departure_time', 'arrival_time', 'price', 'ferry__ferry_name', 'route__route_name',
+        )
+    )
+    seats_left = sellable_seats_left(seat_availability([row[0] for row in schedules]))
+    return [
+        {
+            'schedule_id': schedule_id,
+            'departure_time': departure_time,
+            'arrival_time': arrival_time,
+            'price': price,
+            'ferry': ferry_name,
+            'route': route_name,
+            'seats_left': max(seats_left.get(schedule_id, 0), 0),
+        }
+        for schedule_id, departure_time, arrival_time, price, ferry_name, route_name in schedules
+    ]
+
+
+@throttling.throttle('search')
+def schedule_search_api(request):
+    """Sailings between two ports on a day with the seats left on each, and the shortest distance between the ports"""
+    try:
+        from_port, to_port = int(request.GET['from']), int(request.GET['to'])
+        day = datetime.date.fromisoformat(request.GET['date'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Pass integer 'from' and 'to' port ids and a 'date'."}, status=400)
+    sailings = throttling.coalesce(('search', from_port, to_port, day), lambda: _search(from_port, to_port, day))
+    return JsonResponse({'date': day, **_port_pair(from_port, to_port), 'sailings': sailings})
+
+
+def _port_pair(from_port, to_port):
+    """Shortest distance and typical sailing time between two ports, from the shared route matrix"""
+    matrix = get_route_matrix()
+    duration = matrix.duration(from_port, to_port)
+    return {
+        'from': from_port,
+        'to': to_port,
+        'distance': matrix.distance(from_port, to_port),
+        'duration_seconds': duration.total_seconds() if duration is not None else None,
+    }
+
+
+@staff_member_required
+def throttling_stats_api(request):
+    """Rejected, coalesced and computed request counters of this process"""
+    return JsonResponse({'counters': throttling.counters()})
+
+
+def port_matrix_api(request):
+    """Shortest distance and typical sailing time between two ports"""
+    try:
+        from_port, to_port = int(request.GET['from']), int(request.GET['to'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Pass integer 'from' and 'to' port ids."}, status=400)
+    return JsonResponse(_port_pair(from_port, to_port))
+
+
+@login_required
+@require_POST
+def join_waitlist_api(request, schedule_id):
+    """Put the user on the waitlist of a sold-out sailing"""
+    schedule = get_object_or_404(Schedule, pk=schedule_id)
+    passenger = Passenger.objects.filter(user=request.user).first()
+    if passenger is None:
+        return JsonResponse({'error': "Complete your passenger profile first."}, status=400)
+    priority = waitlist.STANDARD
+    if request.user.is_staff and request.POST.get('priority'):
+        try:
+            priority = int(request.POST['priority'])
+        except ValueError:
+            return JsonResponse({'error': "Invalid priority."}, status=400)
+        if priority not in dict(WaitlistEntry.PRIORITY_CHOICES):
+            return JsonResponse({'error': "Invalid priority."}, status=400)
+    try:
+        entry = waitlist.join_waitlist(schedule, passenger, priority=priority)
+    except ValidationError as exc:
+        return JsonResponse({'error': '; '.join(exc.messages)}, status=400)
+    return JsonResponse({'entry_id': entry.entry_id, 'status': entry.status}, status=201)
+
+
+@login_required
+@require_POST
+def reserve_seat_api(request, schedule_id):
+    """Reserve a seat on a sailing, to be paid with pay_reservation_api"""
+    passenger = Passenger.objects.filter(user=request.user).first()
+    if passenger is None:
+        return JsonResponse({'error': "Complete your passenger profile first."}, status=400)
+    try:
+        reservation = booking.reserve(schedule_id, passenger)
+    except ValidationError as exc:
+        return JsonResponse({'error': '; '.join(exc.messages)}, status=409)
+    return JsonResponse({'reservation_id': reservation.reservation_id, 'status': reservation.status}, status=201)
+
+
+@login_required
+@require_POST
+def pay_reservation_api(request, reservation_id):
+    """Pay a pending reservation and issue its ticket"""
+    passenger = Passenger.objects.filter(user=request.user).first()
+    if passenger is None:
+        return JsonResponse({'error': "Complete your passenger profile first."}, status=400)
+    try:
+        ticket = booking.pay(reservation_id, passenger, request.POST.get('payment_method', 'CREDIT_CARD'))
+    except ValidationError as exc:
+        return JsonResponse({'error': '; '.join(exc.messages)}, status=409)
+    return JsonResponse({'reservation_id': reservation_id, 'ticket_id': ticket.ticket_id})
+
+
+def _own_waitlist_entry(request, entry_id):
+    entry = get_object_or_404(WaitlistEntry.objects.select_related('passenger'), pk=entry_id)
+    if entry.passenger.user_id != request.user.id and not request.user.is_staff:
+        return None
+    return entry
+
+
+@login_required
+@require_POST
+def accept_waitlist_hold_api(request, entry_id):
+    """Pay for a held waitlist seat and issue its ticket"""
+    if _own_waitlist_entry(request, entry_id) is None:
+        return JsonResponse({'error': "Not your waitlist entry."}, status=403)
+    try:
+        ticket = booking.pay_hold(entry_id, request.POST.get('payment_method', 'CREDIT_CARD'))
+    except ValidationError as exc:
+        return JsonResponse({'error': '; '.join(exc.messages)}, status=409)
+    return JsonResponse({'entry_id': entry_id, 'ticket_id': ticket.ticket_id})
+
 
-# Views will be implemented later
+@login_required
+@require_POST
+def leave_waitlist_api(request, entry_id):
+    """Leave a waitlist, releasing a held seat to the next passenger"""
+    if _own_waitlist_entry(request, entry_id) is None:
+        return JsonResponse({'error': "Not your waitlist entry."}, status=403)
+    return JsonResponse({'entry_id': entry_id, 'cancelled': waitlist.leave_waitlist(entry_id)})
@@ -0,0 +1,183 @@
+"""
+Waitlists for sold-out sailings.
+
+Entries queue per schedule in ``(priority, position)`` order, served by the
+``waitlist_queue_idx`` index. When a seat frees up (a ticket is cancelled or
+moved away, a reservation is cancelled or a hold lapses) the head of the
+queue is promoted. Promotion first locks the schedule row (only that row,
+``FOR UPDATE OF``), the lock payments and accepted holds of the sailing take,
+so the free seat it counts cannot be sold in the meantime; then a single
+``SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1`` on that index locks only the
+head row, so promotion costs one index descent however long the queue is.
+
+A promoted entry holds a seat for ``HOLD_DURATION``; the passenger pays for
+it with ``booking.pay_hold`` to get a ticket, otherwise it expires and the
+next entry is promoted. Paying re-checks the sailing and its capacity under
+the schedule row lock, as any payment does. Joins take the same lock, and a
+partial unique constraint allows one WAITING or HELD entry per passenger and
+sailing; MySQL ignores partial constraints, so there the lock is the only
+guard against a passenger queueing twice.
+Seats are counted against the sellable capacity (ferry_system.capacity), so
+expected no-shows can be offered too.
+"""
+
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .capacity import sellable_seats_left
+from .jobs import enqueue
+from .models import Schedule, WaitlistEntry
+from .queries import seat_availability
+
+HOLD_DURATION = datetime.timedelta(minutes=30)
+STANDARD = 2
+
+
+def active_holds(schedule_id, now=None, exclude_entry_id=None):
+    """Number of unexpired holds on a sailing."""
+    holds = WaitlistEntry.objects.filter(
+        schedule_id=schedule_id, status='HELD', hold_expires_at__gt=now or timezone.now(),
+    )
+    if exclude_entry_id is not None:
+        holds = holds.exclude(entry_id=exclude_entry_id)
+    return holds.count()
+
+
+def free_seats(schedule_id, now=None):
+    """Seats that can be sold or offered: sellable capacity minus tickets sold and active holds."""
+    seats_left = sellable_seats_left(seat_availability([schedule_id]))
+    if schedule_id not in seats_left:
+        return 0
+    return seats_left[schedule_id] - active_holds(schedule_id, now)
+
+
+def join_waitlist(schedule, passenger, priority=STANDARD):
+    """Queue ``passenger`` for a sold-out ``schedule``. Raises ValidationError otherwise."""
+    if schedule.departure_time <= timezone.now():
+        raise ValidationError("This sailing has already departed.")
+    already_queued = ValidationError("The passenger is already on the waitlist for this sailing.")
+    try:
+        with transaction.atomic():
+            cancelled = (
+                Schedule.objects.select_for_update(of=('self',))
+                .filter(schedule_id=schedule.pk)
+                .values_list('cancelled', flat=True)
+                .get()
+            )
+            if cancelled:
+                raise ValidationError("This sailing has been cancelled.")
+            if WaitlistEntry.objects.filter(
+                schedule=schedule, passenger=passenger, status__in=['WAITING', 'HELD'],
+            ).exists():
+                raise already_queued
+            if free_seats(schedule.pk) > 0:
+                raise ValidationError("This sailing still has seats available.")
+
+            # Positions only order WAITING entries of one tier, so numbering can restart
+            # once a tier drains
+            last = WaitlistEntry.objects.filter(
+                schedule=schedule, status='WAITING', priority=priority,
+            ).aggregate(last=Max('position'))['last']
+            return WaitlistEntry.objects.create(
+                schedule=schedule, passenger=passenger, priority=priority, position=(last or 0) + 1,
+            )
+    except IntegrityError:
+        raise already_queued
+
+
+def queue_head(schedule_id):
+    """Waiting entries of a sailing in promotion order."""
+    return (
+        WaitlistEntry.objects.filter(schedule_id=schedule_id, status='WAITING')
+        .order_by('priority', 'position', 'entry_id')
+    )
+
+
+def promote_next(schedule_id, now=None):
+    """
+    Offer a hold to the head of the queue if a seat is free. Returns the
+    promoted entry id, or None when the sailing is full or nobody waits.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Hold the seat count still until the entry is HELD
+        locked = (
+            Schedule.objects.select_for_update(of=('self',))
+            .filter(schedule_id=schedule_id, cancelled=False)
+            .values_list('schedule_id', flat=True)
+            .first()
+        )
+        if locked is None or free_seats(schedule_id, now) <= 0:
+            return None
+        entry_id = (
+            queue_head(schedule_id).select_for_update(skip_locked=True)
+            .values_list('entry_id', flat=True)
+            .first()
+        )
+        if entry_id is None:
+            return None
+        expires = now + HOLD_DURATION
+        WaitlistEntry.objects.filter(entry_id=entry_id).update(
+            status='HELD', held_at=now, hold_expires_at=expires,
+        )
+        enqueue('send_waitlist_offer', {'entry_id': entry_id})
+        # One expiry sweep per minute of expiry times, run just after that minute
+        sweep_at = expires.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        enqueue('expire_waitlist_holds', delay=sweep_at - now,
+                dedupe_key=f"expire_waitlist_holds:{sweep_at:%Y%m%d%H%M}")
+    return entry_id
+
+
+def promote_waitlist(schedule_id, limit=None):
+    """Promote entries while seats are free. Returns the promoted entry ids."""
+    promoted = []
+    while limit is None or len(promoted) < limit:
+        entry_id = promote_next(schedule_id)
+        if entry_id is None:
+            break
+        promoted.append(entry_id)
+    return promoted
+
+
+def seats_released(schedule_id, count=1):
+    """Promote up to ``count`` entries once the current transaction commits."""
+    transaction.on_commit(lambda: promote_waitlist(schedule_id, limit=count))
+
+
+def expire_holds(now=None):
+    """Expire lapsed holds and pass their seats on. Returns the number expired."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            WaitlistEntry.objects.select_for_update(skip_locked=True)
+            .filter(status='HELD', hold_expires_at__lte=now)
+            .values_list('entry_id', 'schedule_id')
+        )
+        WaitlistEntry.objects.filter(entry_id__in=[entry_id for entry_id, _ in expired]).update(status='EXPIRED')
+    per_schedule = {}
+    for _, schedule_id in expired:
+        per_schedule[schedule_id] = per_schedule.get(schedule_id, 0) + 1
+    for schedule_id, count in per_schedule.items():
+        promote_waitlist(schedule_id, limit=count)
+    return len(expired)
+
+
+def leave_waitlist(entry_id):
+    """Cancel a waiting or held entry, passing a held seat on. Returns False if it was neither."""
+    with transaction.atomic():
+        entry = (
+            WaitlistEntry.objects.select_for_update()
+            .filter(entry_id=entry_id, status__in=['WAITING', 'HELD'])
+            .values_list('schedule_id', 'status')
+            .first()
+        )
+        if entry is None:
+            return False
+        WaitlistEntry.objects.filter(entry_id=entry_id).update(status='CANCELLED')
+        if entry[1] == 'HELD':
+            seats_released(entry[0])
+    return True
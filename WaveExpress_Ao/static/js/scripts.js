@@ -0,0 +1 @@
+// Site-wide scripts, loaded after Bootstrap on every page.